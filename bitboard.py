@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Bitboard
+
+Sets of cells as the bits of one Python int.  Every cell (x,y) within R
+of the center is bit
+
+	bit = (x + R) + (y + R)*S,   S = 2R + 2
+
+one spare column per row, so shifting a mask one cell sideways lands in
+the spare column instead of wrapping onto the next row, and ANDing with
+`cells` clears it.  R is the board's border plus PAD, enough that
+Billy's perimeter and every guard next to it are on the grid.  Python
+ints have no width limit, so 64x64 boards (a few thousand bits) and
+wider ones are a handful of big int operations.
+
+	occupancy   where the guards are
+	coverage    cells next to a guard, its generatePerimeter, from eight shifts
+	sight       Billy's line of sight moves, his perimeter minus the coverage
+	inside      cells within a border of the center, for alarm zones
+
+	python bitboard.py [border] [guards]
+"""
+
+import random as rand
+import timeit
+
+PAD = 2 # Billy's perimeter is one past him, the guards that cover it one further
+
+_boards = {} # bitboard for each border
+
+#### Helper Functions ####
+def boardFor(border):
+	"""
+	Board For
+
+	Cached bitboard of a board with this border
+	"""
+	if border not in _boards:
+		_boards[border] = bitboard(border)
+	return _boards[border]
+
+#### Class ####
+
+class bitboard(object):
+	"""
+	Bitboard
+
+	Cell masks of the board with this border, padded by PAD
+	"""
+	def __init__(self, border, pad=PAD):
+		self.border = border
+		self.radius = border + pad
+		self.stride = 2*self.radius + 2
+		self.row = (1 << (2*self.radius + 1)) - 1
+		self.cells = sum(self.row << (y*self.stride) for y in range(0, 2*self.radius + 1)) # Every cell, no spare columns
+		self.board = self.inside(border)
+		self.shifts = (1, self.stride - 1, self.stride, self.stride + 1) # Each with its opposite, the eight perimeter moves
+
+	def bit(self, loc):
+		"""
+		Bit
+
+		Mask of loc alone, 0 if it is off the grid
+		"""
+		R = self.radius
+		if abs(loc[0]) > R or abs(loc[1]) > R:
+			return 0
+		return 1 << ((loc[0] + R) + (loc[1] + R)*self.stride)
+
+	def inside(self, border, center=(0,0)):
+		"""
+		Inside
+
+		Cells within border of center (an alarm zone, or the board itself)
+		"""
+		R = self.radius
+		left = max(center[0] - border, -R)
+		right = min(center[0] + border, R)
+		if left > right:
+			return 0
+		row = ((1 << (right - left + 1)) - 1) << (left + R)
+		mask = 0
+		for y in range(max(center[1] - border, -R), min(center[1] + border, R) + 1):
+			mask |= row << ((y + R)*self.stride)
+		return mask
+
+	def occupancy(self, players):
+		"""
+		Occupancy
+
+		Cells with one of the players on them
+		"""
+		mask = 0
+		for player in players:
+			mask |= self.bit(player.location)
+		return mask
+
+	def coverage(self, mask):
+		"""
+		Coverage
+
+		Cells next to a cell of mask, the union of their generatePerimeter.
+		A cell of mask is only covered when another one is next to it.
+		"""
+		covered = 0
+		for shift in self.shifts:
+			covered |= (mask << shift) | (mask >> shift)
+		return covered & self.cells
+
+	def sight(self, loc, guards):
+		"""
+		Sight
+
+		Billy's line of sight moves from loc: his perimeter less every
+		guard's (billy.abstractLineOfSight)
+		"""
+		return self.coverage(self.bit(loc)) & ~self.coverage(self.occupancy(guards))
+
+def main():
+	from sys import argv
+	import player as p
+	border = 32
+	count = 6
+	if len(argv) > 1:
+		border = int(argv[1])
+	if len(argv) > 2:
+		count = int(argv[2])
+
+	billy = p.billy(border)
+	guards = [p.rook(border) for i in range(0, count)]
+	board = boardFor(border)
+	def locations(mask): # Cells of mask as (x,y)
+		R = board.radius
+		points = []
+		while mask:
+			low = mask & -mask
+			y, x = divmod(low.bit_length() - 1, board.stride)
+			points.append((x - R, y - R))
+			mask ^= low
+		return points
+
+	def scan(): # The list scan abstractLineOfSight did
+		perim = billy.generatePerimeter()
+		for g in guards:
+			for spot in g.generatePerimeter():
+				if spot in perim:
+					perim.remove(spot)
+		return perim
+
+	checks = 2000
+	for i in range(0, checks):
+		billy.setLocation((rand.randint(-border, border), rand.randint(-border, border)))
+		for g in guards:
+			g.setLocation((billy.locX() + rand.randint(-2, 2), billy.locY() + rand.randint(-2, 2)))
+		if sorted(scan()) != sorted(locations(board.sight(billy.location, guards))):
+			raise Exception("Bitboard line of sight differs at", billy.location, [g.location for g in guards])
+	print("%d line of sight positions agree, %d x %d board, %d guards next to Billy" % (checks, 2*border + 1, 2*border + 1, count))
+
+	runs = 20000
+	listed = timeit.timeit(scan, number=runs)/runs
+	masked = timeit.timeit(lambda: board.sight(billy.location, guards), number=runs)/runs
+	print("List scan  %.2f us\nBitboard   %.2f us" % (listed*1e6, masked*1e6))
+
+if __name__ == "__main__":
+	main()
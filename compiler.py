@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compiler
+
+Compiles a scenario once: checks the settings, builds every per board
+lookup table, and packs the tables into one contiguous buffer that can be
+published through multiprocessing.shared_memory.  Worker processes attach
+to the buffer and get NumPy views onto it, with nothing recomputed and
+nothing but a small handle pickled.
+
+Workers play off the tables themselves (playTables): Billy's walk and
+every guard's randomStep chain are sampled from the cumulative rows, a
+whole chunk of runs at a time.  That covers random and smart Billy
+against guards that ignore him; knights (whose chain is cut off outside
+the border), sprints, line of sight, weapons and alarms go to
+simulation.runSimulation.
+
+	compiled = compileScenario({"BORDER": 6})
+	handle = compiled.publish()
+	pool = workerPool(handle)             # workers call current()
+	...
+	pool.close(); compiled.unlink()
+
+Tables (outer = board plus the ring Billy escapes onto):
+	move               Billy's one step kernel (randomStep or smartUpdate)
+	                   from each board cell onto board cells then ring cells
+	walk               cumulative rows of move, for sampling
+	landing            outer cell of every column of move
+	guard<i>.rows      randomStep chain of guard i (kernels.guardChain) as
+	guard<i>.indptr    sparse rows: the row of each state, where each row
+	guard<i>.columns   starts, and every entry's next state and
+	guard<i>.weights   probability
+	guard<i>.walk      running sums of each row's weights, row r offset by
+	                   2r so one searchsorted draws from any row
+	guard<i>.initial   its starting distribution
+	guard<i>.start     cumulative initial
+	guard<i>.cells     outer cell of each chain state, -1 off the grid
+"""
+
+import multiprocessing
+from multiprocessing import shared_memory
+import random as rand
+import numpy
+import kernels
+import player as p
+import simulation
+
+ALIGN = 64 # Bytes
+
+_current = None # Scenario attached in this worker
+
+#### Helper Functions ####
+def supported(S):
+	"""
+	Supported
+
+	Raises an Exception for settings playTables doesn't play
+	"""
+	for name in ("KNIGHT", "BILLY_SPRINT", "BILLY_LOS", "BILLY_SUPER", "BILLY_OPTIMAL", "WEAPON", "GUARD_LOS", "CENTER_ALARM", "QUARTILE_ALARMS", "GUARD_SPRINT"):
+		if S[name]:
+			raise Exception("The compiled tables don't play", name)
+
+def validate(S):
+	"""
+	Validate
+
+	Raises an Exception if the settings can't be simulated
+	"""
+	border = S["BORDER"]
+	if not(isinstance(border, int)) or border < 1:
+		raise Exception("BORDER must be a positive integer, not", border)
+	if S["TELEPORTERS"] < 0:
+		raise Exception("TELEPORTERS can't be negative")
+	if S["PATHGUARD"]:
+		p.pathGuard(S["GUARD_PATH"], border).pathCheck()
+	simulation.smartSlopeCheck(S)
+	for name in ("ALARM_CENTER_LOCATION", "QUARTILE_1_LOCATION", "QUARTILE_2_LOCATION", "QUARTILE_3_LOCATION", "QUARTILE_4_LOCATION"):
+		loc = S[name]
+		if abs(loc[0]) > border or abs(loc[1]) > border:
+			raise Exception(name, loc, "is outside the border")
+
+def buildTables(S):
+	"""
+	Build Tables
+
+	Every lookup table for the settings, as a dictionary of arrays
+	"""
+	border = S["BORDER"]
+	inner = kernels.grid(border)
+	outer = kernels.grid(border + 1)
+	Q, E, ring = kernels.billyMatrix(border, smart=S["SMART_BILLY"], slope=S["SMART_SLOPE"])
+
+	tables = {}
+	tables["move"] = numpy.hstack([Q, E])
+	tables["walk"] = numpy.cumsum(tables["move"], axis=1)
+	tables["landing"] = numpy.array([outer.index(loc) for loc in inner.cells + ring])
+
+	for i, guard in enumerate(simulation.makeGuards(S)):
+		chain = kernels.chainFor(guard)
+		lengths = numpy.diff(chain.indptr)
+		sums = numpy.cumsum(chain.weights)
+		before = numpy.concatenate([[0], sums])[chain.indptr[:-1]] # Running sum where each row starts
+		tables["guard%d.rows" % i] = chain.rows
+		tables["guard%d.indptr" % i] = chain.indptr
+		tables["guard%d.columns" % i] = chain.columns
+		tables["guard%d.weights" % i] = chain.weights
+		tables["guard%d.walk" % i] = sums - numpy.repeat(before - 2*numpy.arange(0, len(lengths)), lengths)
+		tables["guard%d.initial" % i] = chain.initial
+		tables["guard%d.start" % i] = numpy.cumsum(chain.initial)
+		tables["guard%d.cells" % i] = numpy.array([outer.index(loc) for loc in chain.locations])
+	return tables
+
+def compileScenario(scenario=None):
+	"""
+	Compile Scenario
+
+	Validates the scenario and builds its tables, packed into one buffer
+	"""
+	S = simulation.settings(scenario)
+	validate(S)
+	tables = buildTables(S)
+
+	layout = {}
+	size = 0
+	for name, table in tables.items():
+		layout[name] = (size, table.dtype.str, table.shape)
+		size += -(-table.nbytes//ALIGN)*ALIGN
+	buffer = numpy.zeros(max(size, 1), dtype=numpy.uint8)
+	for name, table in tables.items():
+		offset, dtype, shape = layout[name]
+		buffer[offset:offset + table.nbytes] = numpy.frombuffer(numpy.ascontiguousarray(table).tobytes(), dtype=numpy.uint8)
+	return compiledScenario(S, layout, buffer)
+
+def attach(handle):
+	"""
+	Attach
+
+	Opens a published scenario without copying it.  Keep the returned
+	compiledScenario alive as long as its tables are used.
+	"""
+	name, settings, layout = handle
+	try:
+		shm = shared_memory.SharedMemory(name=name, track=False) # Python 3.13+
+	except TypeError:
+		shm = shared_memory.SharedMemory(name=name) # Pool workers share the publisher's resource tracker
+	compiled = compiledScenario(settings, layout, numpy.frombuffer(shm.buf, dtype=numpy.uint8))
+	compiled.shm = shm
+	return compiled
+
+def attachWorker(handle):
+	global _current
+	_current = attach(handle)
+
+def current():
+	"""
+	Current
+
+	Scenario the worker attached to in workerPool
+	"""
+	return _current
+
+def workerPool(handle, processes=None):
+	"""
+	Worker Pool
+
+	multiprocessing.Pool whose workers attach to a published scenario once
+	when they start
+	"""
+	return multiprocessing.Pool(processes, initializer=attachWorker, initargs=(handle,))
+
+def simulate(task):
+	"""
+	Simulate
+
+	Worker: runs the attached scenario `runs` times from a seed and returns
+	how often Billy escaped, off its tables when playTables supports it
+	"""
+	runs, seed = task
+	rand.seed(seed)
+	numpy.random.seed(seed % 2**32)
+	compiled = current()
+	try:
+		supported(compiled.settings)
+	except Exception:
+		return sum(simulation.runSimulation(compiled.settings) for i in range(0, runs))
+	return playTables(compiled, runs)
+
+def draw(cumulative, rows):
+	"""
+	Draw
+
+	One column from each of the given rows of a cumulative table
+	"""
+	picked = cumulative[rows]
+	u = numpy.random.random(len(rows))*picked[:, -1]
+	return (picked <= u[:, None]).sum(axis=1)
+
+def step(chain, walk, states):
+	"""
+	Step
+
+	Next state of each of states, drawn from its row of a sparse chain
+	(compiledScenario.guards) through the offset running sums in walk
+	"""
+	rows, indptr, columns, weights = chain
+	row = rows[states]
+	last = indptr[row + 1] - 1
+	target = 2*row + numpy.random.random(len(states))*(walk[last] - 2*row)
+	return columns[numpy.minimum(numpy.searchsorted(walk, target, side="right"), last)]
+
+def playTables(compiled, runs):
+	"""
+	Play Tables
+
+	How many of `runs` runs off a compiled scenario's tables Billy escaped
+	"""
+	return int(playRuns(compiled, runs)[0].sum())
+
+def playRuns(compiled, runs):
+	"""
+	Play Runs
+
+	Plays `runs` runs at once off a compiled scenario's tables, in
+	runSimulation's order (guards step, Billy steps, then the check), and
+	returns arrays (outcomes, lengths): 1 for an escape and how many
+	steps each run took
+	"""
+	supported(compiled.settings)
+	walk = compiled.tables["walk"]
+	landing = compiled.tables["landing"]
+	boardSize = walk.shape[0]
+	guards = []
+	for i, (chain, initial, cells) in enumerate(compiled.guards()):
+		start = compiled.tables["guard%d.start" % i]
+		states = draw(start[None, :], numpy.zeros(runs, dtype=int))
+		guards.append((chain, compiled.tables["guard%d.walk" % i], cells, states))
+
+	billy = numpy.full(runs, boardSize//2) # (0,0)
+	playing = numpy.arange(0, runs)
+	outcomes = numpy.zeros(runs, dtype=numpy.int64)
+	lengths = numpy.zeros(runs, dtype=numpy.int64)
+	while playing.size:
+		lengths[playing] += 1
+		for chain, guardWalk, cells, states in guards:
+			states[playing] = step(chain, guardWalk, states[playing])
+		column = draw(walk, billy[playing])
+		cell = landing[column]
+		caught = numpy.zeros(playing.size, dtype=bool)
+		for chain, guardWalk, cells, states in guards:
+			caught |= cells[states[playing]] == cell
+		out = column >= boardSize # Landed on the ring
+		outcomes[playing[out & ~caught]] = 1
+		billy[playing] = numpy.minimum(column, boardSize - 1)
+		playing = playing[~(out | caught)]
+	return outcomes, lengths
+
+#### Class ####
+
+class compiledScenario(object):
+	"""
+	Compiled Scenario
+
+	Settings plus read only views of every table, all backed by one buffer
+	"""
+	def __init__(self, settings, layout, buffer):
+		self.settings = settings
+		self.layout = layout
+		self.buffer = buffer
+		self.shm = None
+		self.tables = {}
+		for name, (offset, dtype, shape) in layout.items():
+			count = int(numpy.prod(shape))
+			view = numpy.frombuffer(buffer, dtype=numpy.dtype(dtype), count=count, offset=offset).reshape(shape)
+			view.flags.writeable = False
+			self.tables[name] = view
+
+	def guards(self):
+		"""
+		Guards
+
+		(chain, initial, cells) for every guard, chain being its sparse
+		rows (rows, indptr, columns, weights) for kernels.chainStep
+		"""
+		count = len([name for name in self.tables if name.endswith(".rows")])
+		return [(tuple(self.tables["guard%d.%s" % (i, part)] for part in ("rows", "indptr", "columns", "weights")), self.tables["guard%d.initial" % i], self.tables["guard%d.cells" % i]) for i in range(0, count)]
+
+	def publish(self):
+		"""
+		Publish
+
+		Copies the buffer into shared memory and returns the handle workers
+		attach with
+		"""
+		if self.shm is None:
+			self.shm = shared_memory.SharedMemory(create=True, size=self.buffer.nbytes)
+			self.shm.buf[:self.buffer.nbytes] = self.buffer.tobytes()
+		return (self.shm.name, self.settings, self.layout)
+
+	def close(self):
+		self.tables = {}
+		self.buffer = None
+		if self.shm is not None:
+			self.shm.close()
+
+	def unlink(self):
+		"""
+		Unlink
+
+		Closes and frees the shared memory (publisher only)
+		"""
+		if self.shm is not None:
+			shm = self.shm
+			self.close()
+			shm.unlink()
+			self.shm = None
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Equivalence
+
+Checks that a fast engine plays the same game as the reference one
+(simulation.runSimulation with every fast path turned off).
+
+Two statistics are fixed ahead of time for every engine and scenario:
+
+	escape rate     two proportion z test
+	run length      two sample Kolmogorov-Smirnov test on Billy's steps
+
+The reference plays each scenario once, REFERENCE_SHARE times as many
+runs as a candidate, and every candidate is compared with that one
+sample.  Holm's step-down test runs over every p-value in the gate, so
+alpha is the chance that a gate of correct engines fails anywhere; a
+candidate fails if any of its tests is rejected.  With about 100 tests
+at alpha 0.01 the smallest p-value has to be under about 1e-4, so at
+2000 runs and an escape rate near one half the gate catches rate
+differences of about 0.06 four times in five (see detectable), and
+takes about 70 s.  KS is conservative on whole numbers of steps, so it
+only flags real differences.  Speed is reported next to each verdict.
+
+An engine is a function (scenario, runs, seed) -> runLog.  Engines that
+play one run at a time can be wrapped with perRun, ones that play a
+whole batch with batched.  Engines whose runs return an escape chance
+instead of 0 or 1 (EARLY_EXIT) are wrapped with credited; they keep no
+run lengths, so their one test is a z test of their mean credit against
+the reference escape rate.  Register new ones in ENGINES.
+
+	python equivalence.py [runs] [alpha]
+
+exits with status 1 if any candidate fails.
+"""
+
+import math
+import random as rand
+import time
+import numpy
+import compiler
+import packed
+import simulation
+import stepkernels
+
+REFERENCE_SHARE = 4 # Reference runs per candidate run
+FAST_PATHS = ("TELEPORTER_HAZARD", "LEAPFROG", "LAZY_GUARDS", "EARLY_EXIT")
+SCENARIOS = {
+	"default": {},
+	"pathGuard": {"PATHGUARD": True},
+	"smartBilly": {"SMART_BILLY": True},
+	"sprints": {"BILLY_SPRINT": True, "GUARD_SPRINT": True},
+	"guardSight": {"GUARD_LOS": True},
+	"billySight": {"BILLY_LOS": True, "PATHGUARD": True},
+	"teleporters": {"BORDER": 10, "PERIMGUARD": False, "BISHOP": False, "ROOK": False, "TELEPORTERS": 2},
+	"bigBoard": {"BORDER": 8, "PATHGUARD": True, "BILLY_LOS": True},
+	"weapon": {"WEAPON": True, "BILLY_SPRINT": True, "KNIGHT": True},
+	"noKnight": {"KNIGHT": False, "PATHGUARD": True, "SMART_BILLY": True, "TELEPORTERS": 2},
+}
+
+#### Helper Functions ####
+def binomialTest(escapedA, runsA, escapedB, runsB):
+	"""
+	Binomial Test
+
+	Two sided p-value that two escape rates are the same
+	"""
+	pooled = (escapedA + escapedB)/(runsA + runsB)
+	spread = math.sqrt(pooled*(1 - pooled)*(1/runsA + 1/runsB))
+	if spread == 0:
+		return 1.0
+	z = (escapedA/runsA - escapedB/runsB)/spread
+	return math.erfc(abs(z)/math.sqrt(2))
+
+def creditTest(escaped, runs, credits):
+	"""
+	Credit Test
+
+	Two sided p-value that the mean of credits (escape chances, one per
+	run) equals the escape rate of `runs` plain runs
+	"""
+	credits = numpy.asarray(credits, dtype=float)
+	rate = escaped/runs
+	spread = math.sqrt(rate*(1 - rate)/runs + credits.var(ddof=1)/len(credits))
+	if spread == 0:
+		return 1.0
+	z = (credits.mean() - rate)/spread
+	return math.erfc(abs(z)/math.sqrt(2))
+
+def ksTest(samplesA, samplesB):
+	"""
+	KS Test
+
+	Two sample Kolmogorov-Smirnov p-value (asymptotic distribution)
+	"""
+	samplesA = numpy.sort(samplesA)
+	samplesB = numpy.sort(samplesB)
+	values = numpy.union1d(samplesA, samplesB)
+	cdfA = numpy.searchsorted(samplesA, values, side="right")/len(samplesA)
+	cdfB = numpy.searchsorted(samplesB, values, side="right")/len(samplesB)
+	D = numpy.abs(cdfA - cdfB).max()
+	n = len(samplesA)*len(samplesB)/(len(samplesA) + len(samplesB))
+	lam = (math.sqrt(n) + 0.12 + 0.11/math.sqrt(n))*D
+	if lam < 0.3:
+		return 1.0
+	return min(1.0, max(0.0, 2*sum((-1)**(k - 1)*math.exp(-2*k*k*lam*lam) for k in range(1, 101))))
+
+def holm(pValues, alpha):
+	"""
+	Holm
+
+	Which of pValues Holm's step-down test rejects, keeping the chance of
+	any false rejection at alpha
+	"""
+	rejected = [False]*len(pValues)
+	order = sorted(range(0, len(pValues)), key=lambda i: pValues[i])
+	for k, i in enumerate(order):
+		if pValues[i] >= alpha/(len(pValues) - k):
+			break
+		rejected[i] = True
+	return rejected
+
+def detectable(rate, runs, tests, alpha=0.01, power=0.84):
+	"""
+	Detectable
+
+	Escape rate difference the gate catches four times in five (power is
+	that chance's normal quantile) when a candidate plays `runs` runs
+	against REFERENCE_SHARE times as many, at the strictest Holm share
+	of alpha over `tests` tests
+	"""
+	low, high = 0.0, 10.0 # Two sided normal quantile of alpha/tests, by bisection
+	while high - low > 1e-9:
+		z = (low + high)/2
+		if math.erfc(z/math.sqrt(2)) > alpha/tests:
+			low = z
+		else:
+			high = z
+	return (z + power)*math.sqrt(rate*(1 - rate)*(1/runs + 1/(REFERENCE_SHARE*runs)))
+
+def fastPaths(scenario, **on):
+	"""
+	Fast Paths
+
+	The scenario with every fast path of runSimulation off but the ones
+	in on
+	"""
+	return dict(scenario, **dict({name: False for name in FAST_PATHS}, **on))
+
+def seeded(seed):
+	rand.seed(seed)
+	numpy.random.seed(seed % 2**32)
+
+def perRun(play, supports=None):
+	"""
+	Per Run
+
+	Turns a one run function play(scenario, record) -> 1 or 0 into an
+	engine.  supports(settings) says which scenarios it can play, by
+	raising an Exception for the rest.
+	"""
+	def engine(scenario, runs, seed):
+		seeded(seed)
+		log = runLog()
+		for i in range(0, runs):
+			play(scenario, log)
+		return log
+	engine.supports = supports
+	return engine
+
+def batched(game, supports=None):
+	"""
+	Batched
+
+	Turns a batch engine game(scenario, runs) -> (outcomes, lengths)
+	arrays, like compiler.playRuns, into an engine
+	"""
+	def engine(scenario, runs, seed):
+		seeded(seed)
+		log = runLog()
+		outcomes, lengths = game(scenario, runs)
+		log.outcomes = [int(outcome) for outcome in outcomes]
+		log.lengths = [int(length) for length in lengths]
+		return log
+	engine.supports = supports
+	return engine
+
+def credited(play, supports=None):
+	"""
+	Credited
+
+	Turns a one run function play(scenario) -> escape chance into an
+	engine
+	"""
+	def engine(scenario, runs, seed):
+		seeded(seed)
+		return creditLog([play(scenario) for i in range(0, runs)])
+	engine.supports = supports
+	return engine
+
+def plays(engine, scenario):
+	"""
+	Plays
+
+	True if engine supports the scenario
+	"""
+	supports = getattr(engine, "supports", None)
+	if supports is None:
+		return True
+	try:
+		supports(simulation.settings(scenario))
+	except Exception:
+		return False
+	return True
+
+def play(engine, scenario, runs, seed):
+	"""
+	Play
+
+	The engine's log of `runs` runs of the scenario, with the seconds
+	they took
+	"""
+	start = time.perf_counter()
+	log = engine(scenario, runs, seed)
+	log.seconds = time.perf_counter() - start
+	return log
+
+def compare(scenario, candidate, runs=2000, alpha=0.01, reference=None, seed=None):
+	"""
+	Compare
+
+	Runs a candidate engine on one scenario against the reference, either
+	an engine (played here for REFERENCE_SHARE times the runs) or a log
+	it already played, and returns a dictionary of p-values, escape
+	rates, run times and the verdict at alpha (Holm over this
+	comparison's tests alone).  Credited candidates only get the escape
+	rate test, with ks left None.
+	"""
+	if reference is None:
+		reference = ENGINES["reference"]
+	if seed is None:
+		seed = rand.getrandbits(32)
+	a = reference
+	if callable(reference):
+		a = play(reference, scenario, REFERENCE_SHARE*runs, seed)
+	b = play(candidate, scenario, runs, seed + 1) # Independent samples
+
+	result = {
+		"rate": (a.escaped()/a.runs(), b.escaped()/b.runs()),
+		"time": (a.seconds, b.seconds),
+	}
+	if isinstance(b, creditLog):
+		result["binomial"] = creditTest(a.escaped(), a.runs(), b.credits)
+		result["ks"] = None
+		result["pValues"] = [result["binomial"]]
+	else:
+		result["binomial"] = binomialTest(a.escaped(), a.runs(), b.escaped(), b.runs())
+		result["ks"] = ksTest(a.lengths, b.lengths)
+		result["pValues"] = [result["binomial"], result["ks"]]
+	result["speedup"] = a.seconds/a.runs()/(b.seconds/b.runs())
+	result["passed"] = not(any(holm(result["pValues"], alpha)))
+	return result
+
+def gate(engines=None, scenarios=SCENARIOS, runs=2000, alpha=0.01, report=print):
+	"""
+	Gate
+
+	Compares every candidate engine against the reference on every
+	scenario, the reference played once per scenario.  Returns True if
+	they all pass.  alpha is the chance of a false alarm over the whole
+	gate.
+	"""
+	if engines is None:
+		engines = [name for name in ENGINES if name != "reference"]
+	results = []
+	for scenarioName, scenario in scenarios.items():
+		names = [name for name in engines if plays(ENGINES[name], scenario)]
+		if report:
+			for name in engines:
+				if name not in names:
+					report("%-12s %-12s skipped" % (scenarioName, name))
+		if not(names):
+			continue
+		seed = rand.getrandbits(32)
+		reference = play(ENGINES["reference"], scenario, REFERENCE_SHARE*runs, seed)
+		for k, name in enumerate(names):
+			results.append((scenarioName, name, compare(scenario, ENGINES[name], runs, alpha, reference, seed + 1 + k)))
+
+	pValues = [p for scenarioName, name, r in results for p in r["pValues"]]
+	rejected = holm(pValues, alpha)
+	passed = True
+	for scenarioName, name, r in results:
+		r["passed"] = not(any(rejected[:len(r["pValues"])]))
+		rejected = rejected[len(r["pValues"]):]
+		passed = passed and r["passed"]
+		if report:
+			if r["ks"] is None:
+				shown = "p: rate %.4f (mean credit)" % r["binomial"]
+			else:
+				shown = "p: rate %.4f length %.4f" % (r["binomial"], r["ks"])
+			report("%-12s %-12s escaped %.3f vs %.3f   %-30s   %5.2fx  %s" % (scenarioName, name,
+				r["rate"][0], r["rate"][1], shown, r["speedup"], "ok" if r["passed"] else "FAIL"))
+	if report and results:
+		report("%d tests; at an escape rate of one half this gate catches rate differences of %.3f four times in five" % (len(pValues), detectable(0.5, runs, len(pValues), alpha)))
+	return passed
+
+#### Class ####
+
+class runLog(object):
+	"""
+	Run Log
+
+	Recorder for simulation.runSimulation that keeps each run's outcome
+	and length
+	"""
+	jumps = True # Only counts steps, so leapfrog jumps are fine
+
+	def __init__(self):
+		self.outcomes = []
+		self.lengths = []
+		self.length = 0
+
+	def step(self, billy, steps=1):
+		self.length += steps
+
+	def finish(self, billy, catcher):
+		self.outcomes.append(1 if catcher is None else 0)
+		self.lengths.append(self.length)
+		self.length = 0
+
+	def runs(self):
+		return len(self.outcomes)
+
+	def escaped(self):
+		return sum(self.outcomes)
+
+class creditLog(object):
+	"""
+	Credit Log
+
+	Escape chances of the runs of a credited engine
+	"""
+	def __init__(self, credits):
+		self.credits = credits
+
+	def runs(self):
+		return len(self.credits)
+
+	def escaped(self):
+		return sum(self.credits)
+
+ENGINES = {
+	"reference": perRun(lambda scenario, record: simulation.runSimulation(fastPaths(scenario), record=record)),
+	"hazard": perRun(lambda scenario, record: simulation.runSimulation(fastPaths(scenario, TELEPORTER_HAZARD=True), record=record)),
+	"leapfrog": perRun(lambda scenario, record: simulation.runSimulation(fastPaths(scenario, TELEPORTER_HAZARD=True, LEAPFROG=True), record=record)),
+	"packed": perRun(packed.runPacked, packed.supported),
+	"lazy": perRun(lambda scenario, record: simulation.runSimulation(fastPaths(scenario, TELEPORTER_HAZARD=True, LAZY_GUARDS=True), record=record)),
+	"batch": batched(lambda scenario, runs: stepkernels.gameFor(scenario).run(runs)[:2], stepkernels.supported),
+	"compiled": batched(lambda scenario, runs: compiler.playRuns(compiler.compileScenario(scenario), runs), compiler.supported),
+	"early": credited(lambda scenario: simulation.runSimulation(fastPaths(scenario, TELEPORTER_HAZARD=True, EARLY_EXIT=True)), simulation.earlyExitSupported),
+}
+
+def main():
+	from sys import argv, exit
+	runs = 2000
+	alpha = 0.01
+	if len(argv) > 1:
+		runs = int(argv[1])
+	if len(argv) > 2:
+		alpha = float(argv[2])
+	print("Step kernels:", stepkernels.BACKEND)
+	if not(gate(runs=runs, alpha=alpha)):
+		exit(1)
+
+if __name__ == "__main__":
+	main()
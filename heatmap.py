@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Heatmap
+
+Counts where things happen over many runs, as fixed size integer grids
+covering the board plus the ring just outside it (where Billy lands when
+he escapes):
+
+	visits     cells Billy stood on after each step
+	exits      cells Billy escaped onto
+	captures   cells Billy was caught on, one grid per guard class
+
+Cells are buffered and added to the grids in batches, so memory stays the
+same however many runs are recorded.  Heatmaps of the same board add up,
+so workers and shards can each keep their own and merge them at the end:
+
+	total = sum(heatmaps)
+"""
+
+import numpy
+import kernels
+
+class heatmap(object):
+	"""
+	Heatmap
+
+	Recorder for simulation.runSimulation
+	"""
+	jumps = False # Visits need every cell, so runSimulation turns leapfrog off
+
+	def __init__(self, border, batch=65536):
+		self.border = border
+		self.batch = batch
+		self.board = kernels.grid(border + 1)
+		self.runs = 0
+		self.visits = self.empty()
+		self.exits = self.empty()
+		self.captures = {} # guard class name -> grid
+		self.pending = {"visits": [], "exits": []} # Buffered cell numbers
+		self.waiting = 0
+
+	def empty(self):
+		return numpy.zeros(self.board.size, dtype=numpy.int64)
+
+	def step(self, billy, steps=1):
+		self.add("visits", [billy.location])
+
+	def finish(self, billy, catcher):
+		"""
+		Finish
+
+		End of a run.  catcher is the class name of whatever caught Billy,
+		or None if he escaped.
+		"""
+		self.runs += 1
+		if catcher is None:
+			self.add("exits", [billy.location])
+		else:
+			self.add(catcher, [billy.location])
+
+	def add(self, kind, locations):
+		"""
+		Add
+
+		Queue a batch of locations for one of the grids: "visits", "exits"
+		or the name of a guard class for captures.  Locations off the
+		heatmap are dropped.
+		"""
+		cells = self.pending.setdefault(kind, [])
+		for loc in locations:
+			i = self.board.index(loc)
+			if i >= 0:
+				cells.append(i)
+		self.waiting += len(locations)
+		if self.waiting >= self.batch:
+			self.flush()
+
+	def flush(self):
+		"""
+		Flush
+
+		Adds every buffered cell to its grid
+		"""
+		for kind, cells in self.pending.items():
+			if cells:
+				counts = numpy.bincount(cells, minlength=self.board.size)
+				self.grid(kind)[:] += counts
+				del cells[:]
+		self.waiting = 0
+
+	def grid(self, kind):
+		if kind == "visits":
+			return self.visits
+		if kind == "exits":
+			return self.exits
+		if kind not in self.captures:
+			self.captures[kind] = self.empty()
+		return self.captures[kind]
+
+	def show(self, kind):
+		"""
+		Show
+
+		Grid as a 2D array with y going up the rows, for printing or plotting
+		"""
+		self.flush()
+		width = self.board.width
+		return self.grid(kind).reshape(width, width)[::-1]
+
+	def merge(self, other):
+		"""
+		Merge
+
+		Adds another heatmap of the same board into this one
+		"""
+		if other.border != self.border:
+			raise Exception("Can't merge heatmaps of borders", self.border, "and", other.border)
+		self.flush()
+		other.flush()
+		self.runs += other.runs
+		self.visits += other.visits
+		self.exits += other.exits
+		for kind, counts in other.captures.items():
+			self.grid(kind)[:] += counts
+		return self
+
+	def __add__(self, other):
+		total = heatmap(self.border, self.batch)
+		total.merge(self)
+		return total.merge(other)
+
+	def __radd__(self, other):
+		if other == 0: # So sum() works
+			return self + heatmap(self.border, self.batch)
+		return other + self
+
+	def save(self, path):
+		self.flush()
+		grids = {"capture_" + kind: counts for kind, counts in self.captures.items()}
+		numpy.savez(path, border=self.border, runs=self.runs, visits=self.visits, exits=self.exits, **grids)
+
+	@classmethod
+	def load(cls, path):
+		data = numpy.load(path)
+		h = cls(int(data["border"]))
+		h.runs = int(data["runs"])
+		h.visits[:] = data["visits"]
+		h.exits[:] = data["exits"]
+		for name in data.files:
+			if name.startswith("capture_"):
+				h.grid(name[len("capture_"):])[:] = data[name]
+		return h
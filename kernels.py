@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Kernels
+
+Exact movement distributions for the players in player.py, laid out as
+NumPy arrays so whole boards can be stepped at once.
+
+	grid         numbers the cells of a square board
+	billyMoves   Billy's randomMove distribution
+	smartMoves   Billy's smartUpdate distribution
+	smartReach   largest smartUpdate slope a board takes
+	billyMatrix  Billy's one step kernel over the board
+	billyDisplacement  where Billy's random walk is after k steps, away from the border
+	exitTable    when Billy's walk (random or smart) leaves the board with no guards about
+	guardChain   Markov chain of one guard's randomStep
+"""
+
+import copy
+import random as rand
+import numpy
+import player as p
+
+_chains = {} # guardChain for each describe(guard)
+_displacements = {} # billyDisplacement for each number of steps
+_exits = {} # exitTable for each (border, smart, slope, horizon)
+_reaches = {} # smartReach for each (border, radius)
+
+JUMP = 16 # Longest guardChain.advance done in one jump
+POWER_STATES = 400 # Bigger chains walk step by step instead of building matrix powers
+
+#### Helper Functions ####
+def describe(guard):
+	"""
+	Describe
+
+	Everything about a guard that changes its movement, as a string
+	"""
+	return repr((type(guard).__name__, guard.border, getattr(guard, "perimeter", None), getattr(guard, "trail", None), getattr(guard, "center", None)))
+
+def chainFor(guard):
+	"""
+	Chain For
+
+	Cached guardChain for guards that move like this one
+	"""
+	key = describe(guard)
+	if key not in _chains:
+		_chains[key] = guardChain(guard)
+	return _chains[key]
+
+def sample(cumulative):
+	"""
+	Sample
+
+	Index drawn from a cumulative probability array
+	"""
+	return min(int(numpy.searchsorted(cumulative, rand.random()*cumulative[-1], side="right")), len(cumulative) - 1)
+
+def billyMoves(maxStep=1):
+	"""
+	Billy Moves
+
+	List of (movement, probability) pairs for billy.randomMove(maxStep)
+	"""
+	moves = []
+	for x in (-maxStep, 0, maxStep):
+		if x == 0:
+			for y in (-maxStep, maxStep):
+				moves.append(((x,y), 1/3 * 1/2))
+		else:
+			for y in range(-maxStep, maxStep+1):
+				moves.append(((x,y), 1/3 * 1/(2*maxStep + 1)))
+	return moves
+
+def smartMoves(border, loc, slope=0.04):
+	"""
+	Smart Moves
+
+	List of (location, probability) pairs for billy.smartUpdate at loc,
+	taken from smartUpdate itself
+	"""
+	b = p.billy(border, loc)
+	if loc == (0,0): # smartUpdate falls back to randomStep
+		return [(p.addTuple(loc, move), prob) for move, prob in billyMoves()]
+	perimeter, probs = b.smartUpdate(l=True, p=slope)
+	if min(probs) < 0:
+		raise Exception("smartUpdate has negative probabilities at", loc, "on border", border)
+	return list(zip(perimeter, probs))
+
+def smartReach(border, radius=None):
+	"""
+	Smart Reach
+
+	Most smartUpdate puts on the closest border points of one cell within
+	radius (default the border) of the center, in units of its slope p,
+	taken from smartUpdate itself.  Slopes above 1/smartReach give
+	negative probabilities somewhere in there.
+	"""
+	if radius is None:
+		radius = border
+	if (border, radius) not in _reaches:
+		reach = 0
+		for loc in grid(radius).cells:
+			if not(loc == (0,0)):
+				b = p.billy(border, loc)
+				perimeter, probs = b.smartUpdate(l=True, p=1)
+				reach = max(reach, sum(probs[len(perimeter) - len(b.closestPerimsToBorder()):]))
+		_reaches[(border, radius)] = reach
+	return _reaches[(border, radius)]
+
+def billyMatrix(border, smart=False, slope=0.04):
+	"""
+	Billy Matrix
+
+	Billy's one step kernel on the board as (Q, E, ring):
+		Q[cell, cell]   probability of moving between cells of grid(border)
+		E[cell, exit]   probability of stepping off the board onto ring[exit]
+	"""
+	inner = grid(border)
+	outer = grid(border + 1)
+	ring = [loc for loc in outer.cells if not inner.inside(loc)]
+	ringIndex = {loc: i for i, loc in enumerate(ring)}
+
+	Q = numpy.zeros((inner.size, inner.size)) # Stays on the board
+	E = numpy.zeros((inner.size, len(ring))) # Leaves the board
+	for i, loc in enumerate(inner.cells):
+		if smart:
+			moves = smartMoves(border, loc, slope)
+		else:
+			moves = [(p.addTuple(loc, move), prob) for move, prob in billyMoves()]
+		for point, prob in moves:
+			if inner.inside(point):
+				Q[i, inner.index(point)] += prob
+			else:
+				E[i, ringIndex[point]] += prob
+	return Q, E, ring
+
+def billyDisplacement(steps):
+	"""
+	Billy Displacement
+
+	Exact displacement of `steps` of Billy's random walk, the steps fold
+	convolution of billyMoves, as (movements, cumulative).  It only holds
+	while the walk can't reach the border, so it doesn't depend on the board.
+	"""
+	if steps not in _displacements:
+		dist = numpy.zeros((2*steps + 1, 2*steps + 1))
+		dist[steps, steps] = 1
+		for step in range(0, steps):
+			new = numpy.zeros(dist.shape)
+			for (dx, dy), prob in billyMoves():
+				new += prob*numpy.roll(numpy.roll(dist, dx, axis=0), dy, axis=1) # Never wraps, the walk reaches steps at most
+			dist = new
+		movements = [(dx - steps, dy - steps) for dx in range(0, 2*steps + 1) for dy in range(0, 2*steps + 1)]
+		_displacements[steps] = (movements, numpy.cumsum(dist.ravel()))
+	return _displacements[steps]
+
+def exitTableFor(border, smart=False, slope=0.04, horizon=32):
+	"""
+	Exit Table For
+
+	Cached exitTable of Billy's walk
+	"""
+	key = (border, smart, slope if smart else None, horizon)
+	if key not in _exits:
+		_exits[key] = exitTable(border, smart, slope, horizon)
+	return _exits[key]
+
+def chainStep(dist, rows, indptr, columns, weights):
+	"""
+	Chain Step
+
+	Distribution one step after dist on a chain kept as sparse rows
+	(guardChain.rows, indptr, columns, weights)
+	"""
+	mass = numpy.bincount(rows, weights=dist, minlength=len(indptr) - 1) # On each distinct row
+	return numpy.bincount(columns, weights=numpy.repeat(mass, numpy.diff(indptr))*weights, minlength=len(rows))
+
+#### Class ####
+
+class grid(object):
+	"""
+	Grid
+
+	Numbers every cell (x,y) with |x|,|y| <= radius, row by row
+	"""
+	def __init__(self, radius):
+		self.radius = radius
+		self.width = 2*radius + 1
+		self.size = self.width**2
+		self.cells = [(x,y) for y in range(-radius, radius+1) for x in range(-radius, radius+1)]
+
+	def inside(self, loc):
+		return abs(loc[0]) <= self.radius and abs(loc[1]) <= self.radius
+
+	def index(self, loc):
+		"""
+		Index
+
+		Cell number of loc, or -1 if it is off the grid
+		"""
+		if not self.inside(loc):
+			return -1
+		return (loc[1] + self.radius)*self.width + loc[0] + self.radius
+
+class exitTable(object):
+	"""
+	Exit Table
+
+	Billy's walk (randomStep, or smartUpdate with smart) on an empty board,
+	from every cell of grid(border):
+		leave[k, cell]   chance he steps off the board on step k
+		stay[k, cell]    chance he is still on it after k steps
+	and, through walk(), where he is after k steps if he hasn't left
+	"""
+	def __init__(self, border, smart=False, slope=0.04, horizon=32):
+		self.grid = grid(border)
+		Q, E, ring = billyMatrix(border, smart, slope)
+		self.horizon = horizon
+		self.stay = numpy.ones((horizon + 1, self.grid.size))
+		self.leave = numpy.zeros((horizon + 1, self.grid.size))
+		for k in range(1, horizon + 1):
+			self.stay[k] = Q @ self.stay[k - 1]
+			self.leave[k] = self.stay[k - 1] - self.stay[k]
+
+		# Billy's one cell moves, with self.grid.size standing in for off the board
+		moves = [move for move, prob in billyMoves()]
+		self.neighbours = numpy.array([[self.grid.index(p.addTuple(loc, move)) for move in moves] for loc in self.grid.cells])
+		self.neighbours[self.neighbours < 0] = self.grid.size
+		rows = numpy.arange(self.grid.size)[:, None]
+		onBoard = self.neighbours < self.grid.size
+		P = numpy.where(onBoard, Q[rows, numpy.minimum(self.neighbours, self.grid.size - 1)], 0)
+
+		# steer[m, cell] picks the next move given m more steps on the board
+		padded = numpy.hstack((self.stay, numpy.zeros((horizon + 1, 1))))
+		self.steer = numpy.zeros((horizon + 1, self.grid.size, len(moves)))
+		for m in range(1, horizon + 1):
+			self.steer[m] = numpy.cumsum(P*padded[m - 1][self.neighbours], axis=1)
+
+	def left(self, cell, k, inside=1):
+		"""
+		Left
+
+		Chance of leaving within k steps from cell, when each step on the
+		board is survived with chance inside (teleporter checks)
+		"""
+		if inside == 1:
+			return 1 - self.stay[k, cell]
+		return self.leave[1:k+1, cell] @ inside**numpy.arange(0, k)
+
+	def walk(self, cell, k):
+		"""
+		Walk
+
+		Cell Billy is on after k steps from cell, drawn given that he
+		stayed on the board the whole time (stay[k, cell] > 0)
+		"""
+		for m in range(k, 0, -1):
+			cell = self.neighbours[cell, sample(self.steer[m, cell])]
+		return int(cell)
+
+class guardChain(object):
+	"""
+	Guard Chain
+
+	Markov chain of a guard's randomStep over the locations it can reach.
+	Built by asking a copy of the guard for its stepOptions, so the rules
+	stay in player.py.
+
+	Path guards walk trail indices rather than locations.  Knights never
+	check the border, so their chain is cut off `pad` cells outside it and
+	any probability that walks further is dropped.
+
+	The chain is kept as successor lists: options[state] are the equally
+	likely next states, states with the same options share one list, and
+	the distinct lists are also laid out as sparse rows (rows, indptr,
+	columns, weights) for whole distributions.  A teleporter's box is one
+	list for every state.  dense() builds the full matrix, which only
+	power() asks for, on chains of at most POWER_STATES states.
+	"""
+	def __init__(self, guard, pad=3):
+		self.kind = type(guard).__name__
+		probe = copy.copy(guard)
+
+		if isinstance(guard, p.pathGuard):
+			trail = guard.trail
+			self.states = list(range(0, len(trail)))
+			self.locations = list(trail)
+			initial = self.startWeights([trail.index(loc) for loc in trail]) # index of the first match, as in __init__
+			step = lambda i: [(i - 1)%len(trail), (i + 1)%len(trail)]
+		elif isinstance(guard, p.teleporter):
+			initial = self.startWeights(self.startLocations(guard))
+			box = probe.stepOptions() # The same wherever it is
+			step = lambda loc: box
+			self.states = list(initial) + [loc for loc in box if loc not in initial]
+			self.locations = self.states
+		else:
+			initial = self.startWeights(self.startLocations(guard))
+			limit = None
+			if isinstance(guard, p.knight):
+				limit = guard.border + pad
+			def step(loc):
+				probe.location = loc
+				options = probe.stepOptions()
+				if limit is not None:
+					options = [o if abs(o[0]) <= limit and abs(o[1]) <= limit else None for o in options]
+				return options
+			self.states = self.reachable(list(initial), step)
+			self.locations = self.states
+
+		number = {state: i for i, state in enumerate(self.states)}
+		self.options = [] # Equally likely next states of each state, None off the chain
+		lists = {} # Distinct successor list -> its row
+		rows = []
+		last = None
+		for state in self.states:
+			options = step(state)
+			if options is not last: # Teleporters hand back the same box every time
+				last = options
+				successors = tuple(None if option is None else number[option] for option in options)
+				row = lists.setdefault(successors, len(lists))
+			self.options.append(successors)
+			rows.append(row)
+		self.rows = numpy.array(rows, dtype=numpy.int64) # Row of each state
+		lengths = [len([o for o in successors if o is not None]) for successors in lists]
+		self.indptr = numpy.concatenate([[0], numpy.cumsum(lengths)]).astype(numpy.int64) # Row r is entries indptr[r]:indptr[r+1]
+		self.columns = numpy.array([o for successors in lists for o in successors if o is not None], dtype=numpy.int64)
+		self.weights = numpy.array([1/len(successors) for successors in lists for o in successors if o is not None])
+		self.initial = numpy.zeros(len(self.states))
+		for state, weight in initial.items():
+			self.initial[number[state]] += weight
+		self.number = number
+		self.powers = {} # Cumulative rows of matrix**k
+		self.displacements = {} # Knight only, see displacement
+		self.fastest = None
+
+	def entries(self):
+		"""
+		Entries
+
+		Every nonzero of the chain's matrix as (from, to, probability)
+		arrays, duplicates not yet added up
+		"""
+		counts = numpy.diff(self.indptr)[self.rows]
+		starts = numpy.cumsum(counts) - counts
+		entry = numpy.repeat(self.indptr[self.rows] - starts, counts) + numpy.arange(0, counts.sum())
+		return numpy.repeat(numpy.arange(0, len(self.states)), counts), self.columns[entry], self.weights[entry]
+
+	def dense(self):
+		"""
+		Dense
+
+		The chain as a full states x states matrix
+		"""
+		matrix = numpy.zeros((len(self.states), len(self.states)))
+		i, j, w = self.entries()
+		numpy.add.at(matrix, (i, j), w)
+		return matrix
+
+	def spread(self, dist):
+		"""
+		Spread
+
+		Distribution over the states one step after dist (dist @ matrix)
+		"""
+		return chainStep(dist, self.rows, self.indptr, self.columns, self.weights)
+
+	def speed(self):
+		"""
+		Speed
+
+		Furthest a single step can move the guard in either direction
+		"""
+		if self.kind == "teleporter":
+			return float("inf")
+		if self.kind == "knight":
+			return 3
+		if self.fastest is None:
+			xy = numpy.array(self.locations).reshape(len(self.locations), 2)
+			i, j, w = self.entries()
+			self.fastest = int(numpy.abs(xy[i] - xy[j]).max(initial=0))
+		return self.fastest
+
+	def power(self, k):
+		if k not in self.powers:
+			self.powers[k] = numpy.cumsum(numpy.linalg.matrix_power(self.dense(), k), axis=1)
+		return self.powers[k]
+
+	def displacement(self, k):
+		"""
+		Displacement
+
+		Exact k step displacement of a knight as (movements, cumulative).
+		Knights ignore the border, so this is a plain convolution.
+		"""
+		if k not in self.displacements:
+			reach = 3*k
+			dist = numpy.zeros((2*reach + 1, 2*reach + 1))
+			dist[reach, reach] = 1
+			moves = [(3,1),(3,-1),(-3,1),(-3,-1),(1,3),(-1,3),(1,-3),(-1,-3)]
+			for step in range(0, k):
+				new = numpy.zeros(dist.shape)
+				for dx, dy in moves:
+					new += numpy.roll(numpy.roll(dist, dx, axis=0), dy, axis=1)/len(moves) # Never wraps, reach is big enough
+				dist = new
+			movements = [(dx - reach, dy - reach) for dx in range(0, 2*reach + 1) for dy in range(0, 2*reach + 1)]
+			self.displacements[k] = (movements, numpy.cumsum(dist.ravel()))
+		return self.displacements[k]
+
+	def advance(self, guard, k):
+		"""
+		Advance
+
+		Moves the guard straight to a location drawn from its exact k step
+		distribution, as if randomStep had been called k times.  Up to JUMP
+		steps take one jump; longer advances chain jumps of powers of two,
+		so only a handful of tables are ever built.
+		"""
+		if k <= JUMP:
+			self.jump(guard, k)
+			return
+		bit = 1
+		while k:
+			if k & bit:
+				self.jump(guard, bit)
+				k -= bit
+			bit *= 2
+
+	def jump(self, guard, k):
+		if self.kind == "knight":
+			movements, cumulative = self.displacement(k)
+			guard.move(movements[sample(cumulative)])
+		elif self.kind == "pathGuard":
+			guard.index = self.walk(guard.index, k)
+			guard.setLocation(guard.trail[guard.index])
+		else:
+			guard.setLocation(self.locations[self.walk(self.number[guard.location], k)])
+
+	def walk(self, state, k):
+		"""
+		Walk
+
+		State after k steps from state: one draw from the k step matrix, or
+		k draws from the option lists on chains too big for matrix powers
+		"""
+		if len(self.states) <= POWER_STATES:
+			return sample(self.power(k)[state])
+		random = rand.random
+		options = self.options
+		for i in range(0, k):
+			choices = options[state]
+			state = choices[int(random()*len(choices))]
+		return state
+
+	def startLocations(self, guard):
+		"""
+		Start Locations
+
+		Equally likely starting locations, mirroring the guard constructors
+		"""
+		border = guard.border
+		if isinstance(guard, p.squareGuard):
+			Sqborder = guard.perimeter
+			return [(x,y) for x in (-Sqborder, Sqborder) for y in (-Sqborder, Sqborder)]
+		return [(x,y) for x in range(-border, border+1) for y in range(-border, border+1) if not((x,y) == (0,0))]
+
+	def startWeights(self, starts):
+		weights = {}
+		for start in starts:
+			weights[start] = weights.get(start, 0) + 1/len(starts)
+		return weights
+
+	def reachable(self, starts, step):
+		states = list(starts)
+		seen = set(states)
+		index = 0
+		while index < len(states):
+			for option in step(states[index]):
+				if option is not None and option not in seen:
+					seen.add(option)
+					states.append(option)
+			index += 1
+		return states
+
+	def occupancy(self, board, steps):
+		"""
+		Occupancy
+
+		Array of shape (steps, board.size): chance the guard stands on each
+		cell after 1, 2, ... steps, starting from the constructor's spread
+		"""
+		cells = numpy.array([board.index(loc) for loc in self.locations])
+		onBoard = cells >= 0
+		occupancy = numpy.zeros((steps, board.size))
+		dist = self.initial
+		for t in range(0, steps):
+			dist = self.spread(dist)
+			numpy.add.at(occupancy[t], cells[onBoard], dist[onBoard])
+		return occupancy
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Optimizer
+
+Searches guard line ups and path guard trails for the layout Billy
+escapes from least often.
+
+A layout is a set of SCENARIO overrides: which guard types are on the
+board, how many teleporters, and the GUARD_PATH the path guard walks.
+Trails are closed loops that pass pathGuard.pathCheck.  The total number
+of guards is capped, otherwise the answer is always "all of them".
+
+Each generation is raced: every layout gets a few runs, anything whose
+escape rate is clearly worse than the leader is dropped, and the
+survivors get twice as many runs, until one is left or the run cap is
+reached.  The search stops once the budget is spent or the leader has
+held on for a run of generations.  Runs are spread over a
+multiprocessing pool.
+
+	python optimizer.py [budget] [maxGuards]
+"""
+
+import math
+import multiprocessing
+import random as rand
+import numpy
+import player as p
+import simulation
+
+GUARD_TYPES = ["PERIMGUARD", "PATHGUARD", "BISHOP", "ROOK", "KNIGHT"]
+STEPS = [(x,y) for x in (-1,0,1) for y in (-1,0,1) if not((x,y) == (0,0))]
+
+#### Helper Functions ####
+def validTrail(trail, border):
+	"""
+	Valid Trail
+
+	True if trail passes pathGuard.pathCheck on this board and closes up
+	(so the guard never jumps when it wraps around)
+	"""
+	try:
+		p.pathGuard(trail, border).pathCheck()
+	except Exception:
+		return False
+	return max(abs(trail[0][0] - trail[-1][0]), abs(trail[0][1] - trail[-1][1])) <= 1
+
+def randomTrail(border, length):
+	"""
+	Random Trail
+
+	Random walk of about length points that walks back to where it started
+	"""
+	loc = (rand.randint(-border, border), rand.randint(-border, border))
+	trail = [loc]
+	for i in range(0, length//2):
+		options = [p.addTuple(loc, step) for step in STEPS]
+		options = [o for o in options if abs(o[0]) <= border and abs(o[1]) <= border]
+		loc = rand.choice(options)
+		trail.append(loc)
+	start = trail[0]
+	while max(abs(loc[0] - start[0]), abs(loc[1] - start[1])) > 1: # Head home
+		loc = (loc[0] + (start[0] > loc[0]) - (start[0] < loc[0]), loc[1] + (start[1] > loc[1]) - (start[1] < loc[1]))
+		trail.append(loc)
+	return trail
+
+def mutateTrail(trail, border):
+	"""
+	Mutate Trail
+
+	Moves, adds or drops one point of the trail, keeping it valid
+	"""
+	for attempt in range(0, 20):
+		new = list(trail)
+		i = rand.randrange(0, len(new))
+		choice = rand.random()
+		if choice < 0.4:
+			new[i] = p.addTuple(new[i], rand.choice(STEPS))
+		elif choice < 0.7:
+			new.insert(i, p.addTuple(new[i], rand.choice(STEPS)))
+		elif len(new) > 2:
+			del new[i]
+		if validTrail(new, border):
+			return new
+	return trail
+
+def guardCount(layout):
+	count = sum(1 for name in GUARD_TYPES if layout[name])
+	if layout["TELEPORTER"]:
+		count += layout["TELEPORTERS"]
+	return count
+
+def randomLayout(border, maxGuards):
+	layout = {name: False for name in GUARD_TYPES}
+	layout["TELEPORTER"] = False
+	layout["TELEPORTERS"] = 1
+	layout["GUARD_PATH"] = randomTrail(border, rand.randint(4, 4*border))
+	for i in range(0, rand.randint(1, maxGuards)):
+		addGuard(layout, maxGuards)
+	return layout
+
+def addGuard(layout, maxGuards):
+	if guardCount(layout) >= maxGuards:
+		return
+	name = rand.choice(GUARD_TYPES + ["TELEPORTER"])
+	if name == "TELEPORTER" and layout["TELEPORTER"]:
+		layout["TELEPORTERS"] += 1
+	else:
+		layout[name] = True
+
+def mutateLayout(layout, border, maxGuards):
+	"""
+	Mutate Layout
+
+	Swaps a guard in or out, or changes the trail
+	"""
+	new = dict(layout)
+	choice = rand.random()
+	if choice < 0.4 and new["PATHGUARD"]:
+		new["GUARD_PATH"] = mutateTrail(new["GUARD_PATH"], border)
+	elif choice < 0.7:
+		name = rand.choice(GUARD_TYPES + ["TELEPORTER"])
+		if name == "TELEPORTER" and new["TELEPORTER"] and new["TELEPORTERS"] > 1:
+			new["TELEPORTERS"] -= 1
+		else:
+			new[name] = False
+		addGuard(new, maxGuards)
+	else:
+		addGuard(new, maxGuards)
+	if guardCount(new) == 0:
+		return layout
+	return new
+
+def layoutKey(layout):
+	"""
+	Layout Key
+
+	Two layouts with the same key play the same game
+	"""
+	key = tuple(layout[name] for name in GUARD_TYPES + ["TELEPORTER"])
+	if layout["TELEPORTER"]:
+		key += (layout["TELEPORTERS"],)
+	if layout["PATHGUARD"]:
+		key += tuple(layout["GUARD_PATH"])
+	return key
+
+def evaluate(task):
+	"""
+	Evaluate
+
+	Worker: runs a layout `runs` times and returns how often Billy escaped
+	"""
+	layout, runs, seed = task
+	rand.seed(seed)
+	numpy.random.seed(seed % 2**32)
+	escaped = 0
+	for i in range(0, runs):
+		escaped += simulation.runSimulation(layout)
+	return escaped
+
+#### Class ####
+
+class candidate(object):
+	"""
+	Candidate
+
+	A layout and the runs spent on it so far
+	"""
+	def __init__(self, layout):
+		self.layout = layout
+		self.runs = 0
+		self.escaped = 0
+
+	def rate(self):
+		return self.escaped/self.runs
+
+	def error(self):
+		"""
+		Error
+
+		Standard error of the escape rate, never quite zero so a lucky
+		streak can't make a layout look certain
+		"""
+		rate = (self.escaped + 0.5)/(self.runs + 1)
+		return math.sqrt(rate*(1 - rate)/self.runs)
+
+class optimizer(object):
+	"""
+	Optimizer
+
+	Evolutionary search over layouts with raced evaluation
+	"""
+	def __init__(self, scenario=None, maxGuards=4, population=12, startRuns=32, maxRuns=4096, z=2.5, patience=10, processes=None):
+		self.scenario = simulation.settings(scenario)
+		self.border = self.scenario["BORDER"]
+		self.maxGuards = maxGuards
+		self.population = population
+		self.startRuns = startRuns
+		self.maxRuns = maxRuns
+		self.z = z # How many standard errors count as "clearly worse"
+		self.patience = patience # Generations without a new leader before the search has converged
+		self.processes = processes
+		self.seen = {} # layoutKey -> candidate
+		self.used = 0 # Runs spent so far
+
+	def race(self, pool, candidates, budget):
+		"""
+		Race
+
+		Doubles the runs of every candidate still in contention until one
+		is left, the run cap is reached or the budget runs out (the last
+		round shares out whatever is left)
+		"""
+		alive = list(candidates)
+		runs = self.startRuns
+		while len(alive) > 1 and runs <= self.maxRuns:
+			tasks = [(c, runs - c.runs) for c in alive if c.runs < runs]
+			last = sum(n for c, n in tasks) >= budget - self.used
+			if last: # Share out what is left of the budget instead
+				left = budget - self.used
+				tasks = [(c, min(n, left*(i + 1)//len(tasks) - left*i//len(tasks))) for i, (c, n) in enumerate(tasks)]
+				tasks = [(c, n) for c, n in tasks if n > 0]
+			seeds = [rand.getrandbits(63) for c, n in tasks]
+			results = pool.map(evaluate, [(dict(self.scenario, **c.layout), n, seed) for (c, n), seed in zip(tasks, seeds)])
+			for (c, n), escaped in zip(tasks, results):
+				c.runs += n
+				c.escaped += escaped
+				self.used += n
+
+			best = min(alive, key=lambda c: c.rate() + self.z*c.error())
+			bound = best.rate() + self.z*best.error()
+			alive = [c for c in alive if c is best or c.rate() - self.z*c.error() <= bound]
+			if last:
+				break
+			runs *= 2
+		return alive
+
+	def optimize(self, budget=100000):
+		"""
+		Optimize
+
+		Searches until `budget` simulation runs have been spent or the
+		leader has stayed the same for `patience` generations, and returns
+		the best candidates tried
+		"""
+		pool = multiprocessing.Pool(self.processes)
+		try:
+			layouts = [randomLayout(self.border, self.maxGuards) for i in range(0, self.population)]
+			leader = None
+			steady = 0 # Generations the leader has held on
+			while self.used < budget and steady < self.patience:
+				candidates = []
+				for layout in layouts:
+					key = layoutKey(layout)
+					if key not in self.seen:
+						self.seen[key] = candidate(layout)
+					candidates.append(self.seen[key])
+				alive = self.race(pool, candidates, budget)
+				best = self.report(1)
+				if best and best[0] is leader:
+					steady += 1
+				elif best:
+					leader = best[0]
+					steady = 0
+
+				# Next generation: mutations of the leaders plus a few fresh layouts
+				leaders = sorted(alive, key=lambda c: c.rate())[:max(1, self.population//4)]
+				layouts = [mutateLayout(rand.choice(leaders).layout, self.border, self.maxGuards) for i in range(0, self.population - 2)]
+				layouts += [c.layout for c in leaders[:1]]
+				layouts += [randomLayout(self.border, self.maxGuards)]
+		finally:
+			pool.close()
+			pool.join()
+		return self.report()
+
+	def report(self, top=5):
+		tried = [c for c in self.seen.values() if c.runs > 0]
+		tried.sort(key=lambda c: (c.rate() + c.error(), -c.runs))
+		return tried[:top]
+
+def describeLayout(layout):
+	guards = [name for name in GUARD_TYPES if layout[name]]
+	if layout["TELEPORTER"]:
+		guards.append("TELEPORTER x%d" % layout["TELEPORTERS"])
+	text = ", ".join(guards)
+	if layout["PATHGUARD"]:
+		text += "\n    GUARD_PATH = " + str(layout["GUARD_PATH"])
+	return text
+
+def main():
+	from sys import argv
+	budget = 20000
+	maxGuards = 4
+	if len(argv) > 1:
+		budget = int(argv[1])
+	if len(argv) > 2:
+		maxGuards = int(argv[2])
+
+	search = optimizer(maxGuards=maxGuards)
+	best = search.optimize(budget)
+	print("Runs used:", search.used, "\nLayouts tried:", len(search.seen))
+	for c in best:
+		print("\nEscaped: %.3f +/- %.3f (%d runs)" % (c.rate(), c.error(), c.runs))
+		print("   ", describeLayout(c.layout))
+
+if __name__ == "__main__":
+	main()
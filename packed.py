@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Packed
+
+Packed integer coordinates.  Every cell (x,y) within R of the center is
+one int
+
+	cell = (x + R) + (y + R)*W,   W = 2R + 1
+
+so a move is one addition of a precomputed offset, a bounds check is one
+lookup in the zone table, and distances are squared ints.  R is the
+border plus PAD, enough room that nothing on the board can step off the
+grid.  The knight never checks the border; once it reaches the EDGE band
+it is tracked by plain (x, y) until it comes back, and it can't catch
+anyone out there.
+
+packedGame plays runSimulation's game on packed cells with no tuples,
+square roots or player objects in the loop.  It covers random, smart and
+line of sight Billy, sprints and every guard type; guard line of sight,
+alarms, weapons, super and optimal Billy need the reference engine.
+
+	python packed.py [runs]
+"""
+
+import bisect
+import random as rand
+import kernels
+import player as p
+import simulation
+
+PAD = 40 # Cells past the border
+BOARD, OFF, EDGE = 0, 1, 2 # Zones
+FAR = -10**9 # Cell of a knight off the grid, never next to anything
+
+BILLY_MOVES = [(x,y) for x in (-1,1) for y in (-1,0,1) for twice in range(2)] + [(0,y) for y in (-1,1) for thrice in range(3)] # billy.randomStep, equally likely
+EIGHT = [(1,1),(1,0),(1,-1),(0,1),(0,-1),(-1,1),(-1,0),(-1,-1)] # generatePerimeter order
+KNIGHT_MOVES = [(3*l, s) for l in (1,-1) for s in (1,-1)] + [(s, 3*l) for l in (1,-1) for s in (1,-1)]
+BISHOP_MOVES = [(1,1),(1,-1),(-1,1),(-1,-1)]
+ROOK_MOVES = [(1,0),(0,1),(-1,0),(0,-1)]
+
+_grids = {} # cellGrid for each border
+_games = {} # packedGame for each gameKey
+
+#### Helper Functions ####
+def gridFor(border):
+	if border not in _grids:
+		_grids[border] = cellGrid(border)
+	return _grids[border]
+
+def supported(S):
+	"""
+	Supported
+
+	Raises an Exception for settings the packed engine doesn't play
+	"""
+	for name in ("BILLY_SUPER", "BILLY_OPTIMAL", "WEAPON", "GUARD_LOS", "CENTER_ALARM", "QUARTILE_ALARMS"):
+		if S[name]:
+			raise Exception("The packed engine doesn't support", name)
+
+def gameKey(S):
+	key = tuple(S[name] for name in ("BORDER", "PERIMGUARD", "PATHGUARD", "BISHOP", "ROOK", "KNIGHT", "TELEPORTER", "TELEPORTERS", "BILLY_SPRINT", "SMART_BILLY", "BILLY_LOS", "GUARD_SPRINT", "SMART_SLOPE"))
+	if S["PATHGUARD"]:
+		key += tuple(S["GUARD_PATH"])
+	return key
+
+def gameFor(scenario=None):
+	"""
+	Game For
+
+	Cached packedGame for a scenario
+	"""
+	S = simulation.settings(scenario)
+	supported(S)
+	key = gameKey(S)
+	if key not in _games:
+		_games[key] = packedGame(S)
+	return _games[key]
+
+def runPacked(scenario=None, record=None):
+	"""
+	Run Packed
+
+	Drop in for simulation.runSimulation(scenario, record): 1 if Billy
+	escaped, 0 if he was caught
+	"""
+	return gameFor(scenario).run(record)
+
+#### Class ####
+
+class cellGrid(object):
+	"""
+	Cell Grid
+
+	Packed cells of the board plus PAD cells on every side
+	"""
+	def __init__(self, border, pad=PAD):
+		self.border = border
+		self.radius = border + pad
+		self.width = 2*self.radius + 1
+		self.size = self.width**2
+		R = self.radius
+		self.xs = [i % self.width - R for i in range(0, self.size)]
+		self.ys = [i//self.width - R for i in range(0, self.size)]
+		self.zone = bytearray(self.size)
+		for i in range(0, self.size):
+			x, y = self.xs[i], self.ys[i]
+			if abs(x) > R - 3 or abs(y) > R - 3:
+				self.zone[i] = EDGE # A knight jump from here could leave the grid
+			elif abs(x) > border or abs(y) > border:
+				self.zone[i] = OFF
+		self.center = self.pack((0,0))
+		self.near = frozenset(self.offset(move) for move in EIGHT) # Offsets of the 8 neighbours
+
+	def pack(self, loc):
+		return (loc[0] + self.radius) + (loc[1] + self.radius)*self.width
+
+	def unpack(self, cell):
+		return (self.xs[cell], self.ys[cell])
+
+	def offset(self, move):
+		return move[0] + move[1]*self.width
+
+	def options(self, cell, moves, limit):
+		"""
+		Options
+
+		Cells reachable with moves from cell that stay within limit of the
+		center (guard.randomMove_from_movements)
+		"""
+		x, y = self.xs[cell], self.ys[cell]
+		return tuple(self.pack((x + dx, y + dy)) for dx, dy in moves if abs(x + dx) <= limit and abs(y + dy) <= limit)
+
+class packedView(object):
+	"""
+	Packed View
+
+	Stands in for billy when a recorder asks for his location
+	"""
+	def __init__(self, grid):
+		self.grid = grid
+		self.cell = grid.center
+
+	@property
+	def location(self):
+		return self.grid.unpack(self.cell)
+
+class packedGame(object):
+	"""
+	Packed Game
+
+	Every table one scenario needs, and run() to play it
+	"""
+	WALK, PATH, KNIGHT, TELEPORTER = range(0, 4)
+
+	def __init__(self, S):
+		border = S["BORDER"]
+		self.S = S
+		self.grid = g = gridFor(border)
+		everyCell = range(0, g.size)
+		inside = lambda cell: g.zone[cell] == BOARD
+
+		self.billyMoves = tuple(g.offset(move) for move in BILLY_MOVES)
+		self.eight = tuple(g.offset(move) for move in EIGHT)
+		self.knightMoves = tuple(g.offset(move) for move in KNIGHT_MOVES)
+		self.smart = {} # cell -> (cells, cumulative), filled on first use
+		board = [cell for cell in everyCell if inside(cell) and not(cell == g.center)]
+
+		# One entry per guard, in makeGuards order: (kind, name, start cells, table)
+		self.guards = []
+		if S["PERIMGUARD"]:
+			ring = [cell for cell in everyCell if max(abs(g.xs[cell]), abs(g.ys[cell])) == border]
+			table = {}
+			for cell in ring:
+				guard = p.squareGuard(border)
+				guard.location = g.unpack(cell)
+				table[cell] = tuple(g.pack(loc) for loc in guard.stepOptions())
+			corners = [g.pack((x,y)) for x in (-border, border) for y in (-border, border)]
+			self.guards.append((self.WALK, "squareGuard", corners, self.walkTable(table)))
+		if S["PATHGUARD"]:
+			trail = S["GUARD_PATH"]
+			self.trail = tuple(g.pack(loc) for loc in trail)
+			self.trailStart = [trail.index(loc) for loc in trail] # pathGuard keeps the first match
+			self.guards.append((self.PATH, "pathGuard", self.trailStart, None))
+		if S["BISHOP"]:
+			self.guards.append((self.WALK, "bishop", board, self.walkTable({cell: g.options(cell, BISHOP_MOVES, border) for cell in board + [g.center]})))
+		if S["ROOK"]:
+			self.guards.append((self.WALK, "rook", board, self.walkTable({cell: g.options(cell, ROOK_MOVES, border) for cell in board + [g.center]})))
+		if S["KNIGHT"]:
+			self.guards.append((self.KNIGHT, "knight", board, None))
+		if S["TELEPORTER"]:
+			box = tuple(board + [g.center])
+			for i in range(0, S["TELEPORTERS"]):
+				self.guards.append((self.TELEPORTER, "teleporter", board, box))
+		self.names = [name for kind, name, start, table in self.guards]
+
+	def walkTable(self, options):
+		table = [()]*self.grid.size
+		for cell, cells in options.items():
+			table[cell] = cells
+		return table
+
+	def smartMoves(self, cell):
+		"""
+		Smart Moves
+
+		billy.smartUpdate at cell as (cells, cumulative)
+		"""
+		if cell not in self.smart:
+			cells = []
+			cumulative = []
+			total = 0
+			for loc, prob in kernels.smartMoves(self.grid.border, self.grid.unpack(cell), self.S["SMART_SLOPE"]):
+				total += prob
+				cells.append(self.grid.pack(loc))
+				cumulative.append(total)
+			self.smart[cell] = (tuple(cells), cumulative)
+		return self.smart[cell]
+
+	def run(self, record=None):
+		"""
+		Run
+
+		One escape attempt, stepped exactly like runSimulation
+		"""
+		S = self.S
+		g = self.grid
+		zone = g.zone
+		xs, ys = g.xs, g.ys
+		near = g.near
+		random = rand.random
+		edge = g.radius - 3
+		WALK, PATH, KNIGHT = self.WALK, self.PATH, self.KNIGHT
+		billyMoves, eight, knightMoves = self.billyMoves, self.eight, self.knightMoves
+		trail = getattr(self, "trail", ())
+		SMART, LOS = S["SMART_BILLY"], S["BILLY_LOS"]
+		BILLY_SPRINT, GUARD_SPRINT = S["BILLY_SPRINT"], S["GUARD_SPRINT"]
+
+		kinds = [kind for kind, name, start, table in self.guards]
+		tables = [table for kind, name, start, table in self.guards]
+		cells = []
+		index = {} # Trail index of the path guard
+		farX = {} # Location of knights off the grid
+		farY = {}
+		for i, (kind, name, start, table) in enumerate(self.guards):
+			if kind == PATH:
+				index[i] = start[int(random()*len(start))]
+				cells.append(trail[index[i]])
+			else:
+				cells.append(start[int(random()*len(start))])
+		guardRange = range(0, len(cells))
+
+		billy = g.center
+		caught = False
+		out = False
+		catcher = []
+		view = packedView(g) if record else None
+
+		def guardStep():
+			for i in guardRange:
+				kind = kinds[i]
+				if kind == WALK:
+					options = tables[i][cells[i]]
+					cells[i] = options[int(random()*len(options))]
+				elif kind == PATH:
+					index[i] = (index[i] + (1 if random() < 0.5 else -1)) % len(trail)
+					cells[i] = trail[index[i]]
+				elif kind == KNIGHT:
+					if cells[i] == FAR:
+						dx, dy = KNIGHT_MOVES[int(random()*8)]
+						farX[i] += dx
+						farY[i] += dy
+						if abs(farX[i]) <= edge and abs(farY[i]) <= edge:
+							cells[i] = g.pack((farX[i], farY[i]))
+					else:
+						cell = cells[i] + knightMoves[int(random()*8)]
+						if zone[cell] == EDGE:
+							farX[i], farY[i] = xs[cell], ys[cell]
+							cell = FAR
+						cells[i] = cell
+				else:
+					box = tables[i]
+					cells[i] = box[int(random()*len(box))]
+
+		def billyStep(cell):
+			if SMART:
+				moves, cumulative = self.smartMoves(cell)
+				cell = moves[min(bisect.bisect(cumulative, random()*cumulative[-1]), len(moves) - 1)]
+			if LOS:
+				options = [cell + o for o in eight if not(any(cell + o - guard in near for guard in cells))]
+				if not options:
+					return cell, True # Trapped
+				cell = options[int(random()*len(options))]
+			elif not(SMART):
+				cell += billyMoves[int(random()*18)]
+			return cell, False
+
+		def check():
+			if billy in cells:
+				catcher.append(self.names[cells.index(billy)])
+				return True
+			return False
+
+		while not(caught) and not(out):
+			guardStep()
+			if GUARD_SPRINT:
+				caught = check() or caught
+				guardStep()
+
+			billy, trapped = billyStep(billy)
+			caught = caught or trapped
+			out = out or zone[billy] != BOARD
+			if BILLY_SPRINT:
+				caught = check() or caught
+				billy, trapped = billyStep(billy)
+				caught = caught or trapped
+				out = out or zone[billy] != BOARD
+
+			caught = check() or caught
+			if record:
+				view.cell = billy
+				record.step(view)
+
+		if record:
+			view.cell = billy
+			if caught:
+				record.finish(view, catcher[0] if catcher else "trapped")
+			else:
+				record.finish(view, None)
+		if caught:
+			return 0
+		return 1
+
+def main():
+	from sys import argv
+	import time
+	runs = 10000
+	if len(argv) > 1:
+		runs = int(argv[1])
+	for name, play in (("reference", lambda: simulation.runSimulation({"TELEPORTER_HAZARD": False})), ("packed", runPacked)):
+		start = time.perf_counter()
+		escaped = sum(play() for i in range(0, runs))
+		print("%-10s escaped %.4f  %.0f runs/s" % (name, escaped/runs, runs/(time.perf_counter() - start)))
+
+if __name__ == "__main__":
+	main()
@@ -39,6 +39,7 @@ import random as rand # For random movements
 import numpy # For weighting choices with probabilities
 import itertools
 import math # for square root in distance function
+import bitboard as bb # Cell sets as int masks
 
 #### Helper Functions ####
 def addTuple(t1, t2):
@@ -54,6 +55,16 @@ def distance(t1, t2):
 
 	return math.sqrt( (x2 - x1)**2 + (y2 - y1)**2)
 
+def distanceSquared(t1, t2):
+	"""
+	Distance Squared
+
+	For comparing distances: same order as distance, no square root
+	"""
+	dx = t2[0] - t1[0]
+	dy = t2[1] - t1[1]
+	return dx*dx + dy*dy
+
 def borderPoint(loc, border):
 	"""
 	Border Point
@@ -85,7 +96,7 @@ def closestPerimsToBorder(perim, border):
 		options = [(loc[0], border), (loc[0], -border), (border, loc[1]), (-border, loc[1]), (border, border), (-border, -border), (border, -border), (-border, border)]
 		shortestDist = float("inf")
 		for op in options:
-			dist = distance(op, loc)
+			dist = distanceSquared(op, loc)
 			if dist < shortestDist:
 				shortestDist = dist
 		allDistances.append(shortestDist) # The distance between each perimeter point and its closest border is now stored 
@@ -208,6 +219,7 @@ class billy(player):
 		self.weapon = weapon
 		self.probX = probability
 		self.probY = probability
+		self.trace = None # Likelihood trace, see reweight.py
 
 	def caughtCheck(self, options):
 		"""
@@ -275,8 +287,8 @@ class billy(player):
 			self.probX = list(map(lambda x: x-subtract, self.probX))
 			self.probY = list(map(lambda x: x-subtract, self.probY))
 
-			x = int(numpy.random.choice(3, 1, p=self.probX)) -1
-			y = int(numpy.random.choice(3, 1, p=self.probY)) -1
+			x = int(numpy.random.choice(3, 1, p=self.probX)[0]) -1
+			y = int(numpy.random.choice(3, 1, p=self.probY)[0]) -1
 
 			self.move((x,y))
 		else:
@@ -292,7 +304,7 @@ class billy(player):
 			options = [(loc[0], border), (loc[0], -border), (border, loc[1]), (-border, loc[1]), (border, border), (-border, -border), (border, -border), (-border, border)]
 			shortestDist = float("inf")
 			for op in options:
-				dist = distance(op, loc)
+				dist = distanceSquared(op, loc)
 				if dist < shortestDist:
 					shortestDist = dist
 			allDistances.append(shortestDist) # The distance between each perimeter point and its closest border is now stored 
@@ -312,12 +324,14 @@ class billy(player):
 			points = self.closestPerimsToBorder()
 			
 			pointProb = []
+			multipliers = 0
 
 			for point in points:
 				perimeter.remove(point) # remove point from perimeter
 				multiplier = max(abs(point[0]), abs(point[1])) -1 # because at (0,0) there is no probability
 				prob = multiplier*p # find probability
 				pointProb.append(prob) # add to list
+				multipliers += multiplier
 
 			perimProb = [(1-sum(pointProb))/(len(perimeter))]*len(perimeter)
 
@@ -325,9 +339,11 @@ class billy(player):
 			perimProb.extend(pointProb)
 
 			if not(l):
-				index = int(numpy.random.choice(8, 1, p=perimProb))
+				index = int(numpy.random.choice(8, 1, p=perimProb)[0])
 				loc = perimeter[index]
-				self.location = loc
+				if self.trace is not None:
+					self.trace.smart(index >= 8 - len(points), multipliers)
+				self.setLocation(loc)
 			else:
 				return [perimeter, perimProb]
 
@@ -343,16 +359,16 @@ class billy(player):
 
 		Combines smart Update and Line of Sigth
 		"""
-		los = self.abstractLineOfSight(guards) #available line of sight locations
+		board = self.bitboard()
+		los = board.sight(self.location, guards) #available line of sight locations, as a mask
 		smart = self.smartUpdate(l=True) #available smart locations
 
 		common = []
-		probabilities = []
 
-		for index in range(0, len(smart[0])-1): # create a list of all common points
-			if smart[0][index] in los:
-				common.append(smart[0][index]) # update list of common points
-				probabilities.append(smart[1][index]) # update list of probabilities
+		if not(self.location == (0,0)): # smartUpdate hands back a bare perimeter at (0,0), nothing in common
+			for point in smart[0][:-1]: # create a list of all common points
+				if board.bit(point) & los:
+					common.append(point) # update list of common points
 
 		if not(common):
 			self.lineOfSight(guards)
@@ -360,6 +376,24 @@ class billy(player):
 			loc = rand.choice(common)
 			self.setLocation(loc)
 
+	def bitboard(self):
+		"""
+		Bitboard
+
+		bitboard.bitboard big enough for Billy's perimeter and every guard
+		next to it, even once he is out of bounds
+		"""
+		return bb.boardFor(max(self.border, abs(self.locX()), abs(self.locY())))
+
+	def policyUpdate(self, policy, guards):
+		"""
+		Policy Update
+
+		Moves Billy with a precomputed escape policy (see policy.py),
+		looked up from his location and the guards next to him
+		"""
+		self.move(policy.choose(self.location, guards))
+
 	def abstractLineOfSight(self, guards):
 		"""
 		Abstract Line of Sight
@@ -371,15 +405,10 @@ class billy(player):
 
 		"""
 
-		perim = self.generatePerimeter()
+		board = self.bitboard()
+		los = board.sight(self.location, guards)
 
-		for g in guards:
-			spots = g.generatePerimeter()
-			for spot in spots:
-				if spot in perim:
-					perim.remove(spot)
-
-		return perim
+		return [spot for spot in self.generatePerimeter() if board.bit(spot) & los] # generatePerimeter order
 
 	def lineOfSight(self, guards):
 		"""
@@ -417,7 +446,9 @@ class billy(player):
 			for g in guard:
 				if self.location == g.location:
 					x = numpy.random.choice([0,1], 1, p=[p, 1-p]) # 10% chance he is caught
-					if options[int(x)]:
+					if self.trace is not None:
+						self.trace.weapon(options[int(x[0])])
+					if options[int(x[0])]:
 						self.location = (0,0) # Reset location
 						self.weapon = False
 						self.Caught = False
@@ -557,6 +588,14 @@ class squareGuard(guard):
 		move = rand.choice(options)
 		self.move(move)
 
+	def stepOptions(self):
+		"""
+		Step Options
+
+		Locations randomStep can move to, each equally likely
+		"""
+		return [addTuple(move, self.location) for move in self.squareGuard_Option_Calculator()]
+
 	def lineOfSight(self, billy):
 		"""
 		Line of Sight
@@ -569,10 +608,10 @@ class squareGuard(guard):
 		if billLoc in perimeter:
 			closeDist = float("inf")
 			for movement in self.squareGuard_Option_Calculator():
-				dist = distance(movement, billLoc)
+				dist = distanceSquared(movement, billLoc)
 				if dist < closeDist:
 					closest = movement
-					closeDist = distance(closest, billLoc)
+					closeDist = dist
 			self.move(closest)
 		else:
 			self.randomStep()
@@ -606,6 +645,15 @@ class pathGuard(guard):
 		self.index = (self.index + rand.choice((-1,1))) % len(self.trail) # Update trail index to point to next or previous location point
 		self.setLocation(self.trail[self.index]) # Update location to new list location
 
+	def stepOptions(self):
+		"""
+		Step Options
+
+		Locations randomStep can move to, each equally likely
+		"""
+		trailLength = len(self.trail)
+		return [self.trail[(self.index - 1)%trailLength], self.trail[(self.index + 1)%trailLength]]
+
 	def pathCheck(self):
 		"""
 		Path Check
@@ -628,7 +676,7 @@ class pathGuard(guard):
 				if abs(point[0]) > self.border or abs(point[1]) > self.border:
 					borderPoints.append(point)
 				if not not borderPoints: # Returns True if there is something in the list
-					Exception("Points:", borderPoints, "are not within defined border!") # Prints all the problem points
+					raise Exception("Points:", borderPoints, "are not within defined border!") # Prints all the problem points
 
 		# Unit Check
 		for index in range(0,len(trail) -1):
@@ -653,8 +701,8 @@ class pathGuard(guard):
 			loc1 = self.trail[(self.index+1)%trailLength]
 			loc2 = self.trail[(self.index -1)%trailLength]
 
-			dist1 = distance(loc1, target)
-			dist2 = distance(loc2, target)
+			dist1 = distanceSquared(loc1, target)
+			dist2 = distanceSquared(loc2, target)
 
 			if dist1 > dist2:
 				self.setLocation(self.trail[(self.index -1)%trailLength])
@@ -690,6 +738,15 @@ class bishop(guard):
 		points = list(itertools.product((stepSize, -stepSize), (stepSize, -stepSize))) # Produces a list of all possible movements
 		self.randomMove_from_movements(points)
 
+	def stepOptions(self, stepSize=1):
+		"""
+		Step Options
+
+		Locations randomStep can move to, each equally likely
+		"""
+		points = list(itertools.product((stepSize, -stepSize), (stepSize, -stepSize)))
+		return self.outsideBorder(list(map(lambda x: addTuple(x, self.location), points)))
+
 	def lineOfSightOld(self, billy, amount=0.1):
 		"""
 		Line of Sight 
@@ -712,8 +769,8 @@ class bishop(guard):
 
 			# Calculate new random location with new probabilties
 			options = [-1,1]
-			x = int(numpy.random.choice(options, 1, p=self.probX))
-			y = int(numpy.random.choice(options, 1, p=self.probY))
+			x = int(numpy.random.choice(options, 1, p=self.probX)[0])
+			y = int(numpy.random.choice(options, 1, p=self.probY)[0])
 
 			self.setLocation((x,y)) # update locations
 
@@ -773,6 +830,15 @@ class rook(guard):
 		points = [(stepSize,0), (0,stepSize), (-stepSize,0), (0,-stepSize)] # all possible paths
 		self.randomMove_from_movements(points)
 
+	def stepOptions(self, stepSize=1):
+		"""
+		Step Options
+
+		Locations randomStep can move to, each equally likely
+		"""
+		points = [(stepSize,0), (0,stepSize), (-stepSize,0), (0,-stepSize)]
+		return self.outsideBorder(list(map(lambda x: addTuple(x, self.location), points)))
+
 	def lineOfSight(self, billy):
 		"""
 		Line of Sight
@@ -814,6 +880,20 @@ class knight(guard):
 			self.moveY(longL)
 			self.moveX(shortL)
 
+	def stepOptions(self):
+		"""
+		Step Options
+
+		Locations randomStep can move to, each equally likely.
+		The knight never checks the border.
+		"""
+		points = []
+		for longL in (1,-1):
+			for shortL in (1,-1):
+				points.append((3*longL, shortL))
+				points.append((shortL, 3*longL))
+		return list(map(lambda x: addTuple(x, self.location), points))
+
 class teleporter(guard):
 	"""
 	Teleporter
@@ -843,6 +923,29 @@ class teleporter(guard):
 		y = rand.randrange(centerY-border, centerY + border+1)
 		self.setLocation((x,y))
 
+	def stepOptions(self):
+		"""
+		Step Options
+
+		Locations randomStep can move to, each equally likely
+		"""
+		border = self.border
+		centerX = self.center[0]
+		centerY = self.center[1]
+		return [(x,y) for x in range(centerX - border, centerX + border+1) for y in range(centerY - border, centerY + border+1)]
+
+	def captureProbability(self, loc):
+		"""
+		Capture Probability
+
+		Chance that the next randomStep lands on loc.  randomStep is memoryless,
+		so this only depends on loc and the current (possibly alarm-shrunk) box.
+		"""
+		border = self.border
+		if abs(loc[0] - self.center[0]) > border or abs(loc[1] - self.center[1]) > border:
+			return 0
+		return 1/(2*border + 1)**2
+
 	def alarmCheck(self, alarm):
 		if alarm.triggered:
 			self.border = alarm.border
@@ -873,10 +976,10 @@ class centerAlarm(alarm):
 		super().__init__(border, location, triggered)
 
 	def guardCheck(self, guard): # list of guards
-		for g in guard:
-			if abs(g.location[0]) <= self.border and abs(g.location[1]) <= self.border:
-				self.triggered = True
-				return self.triggered
+		board = bb.boardFor(self.border) # Zone is within border of (0,0)
+		if board.occupancy(guard) & board.board:
+			self.triggered = True
+			return self.triggered
 
 class quartileAlarm(alarm):
 	def __init__(self, location, border=0, triggered=False):
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Policy
+
+Escape-maximizing policy for Billy, worked out once per board and guard
+line up by value iteration and kept as a lookup table.
+
+Billy moves after the guards, so when he picks his move he can see which
+of his 8 neighbours a guard is standing on.  The table is indexed by his
+cell and that 8-bit mask:
+
+	table[cell, mask] -> index into OFFSETS
+
+Guards are modelled by how often they stand on each cell over the first
+`horizon` steps (kernels.guardChain), independently of each other.
+Teleporters handled by the hazard fast path are invisible to Billy and
+only count through their capture chance.
+
+Tables are cached in memory and on disk (in CACHE_DIR, the user's cache
+directory: $XDG_CACHE_HOME or ~/.cache, under prison_escape/policy) so
+they are only built once per configuration.  Pass cacheDir=None to keep
+them in memory only.
+"""
+
+import hashlib
+import os
+import numpy
+import kernels
+
+OFFSETS = [(1,1),(1,0),(1,-1),(0,1),(0,-1),(-1,1),(-1,0),(-1,-1)] # generatePerimeter order
+BIT = {offset: 1 << i for i, offset in enumerate(OFFSETS)}
+CACHE_ROOT = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "prison_escape") # Every module's files on disk
+CACHE_DIR = os.path.join(CACHE_ROOT, "policy")
+VERSION = 1 # Bump when the model changes so old tables are rebuilt
+
+_tables = {} # In memory cache
+
+#### Helper Functions ####
+def guardHazard(board, guards, horizon):
+	"""
+	Guard Hazard
+
+	Chance that at least one guard stands on each cell of the board,
+	averaged over the first horizon steps
+	"""
+	free = numpy.ones(board.size)
+	for g in guards:
+		occupancy = kernels.chainFor(g).occupancy(board, horizon).mean(axis=0)
+		free *= 1 - numpy.minimum(occupancy, 1)
+	return 1 - free
+
+def teleporterHazard(board, teleporters):
+	"""
+	Teleporter Hazard
+
+	Chance that a hidden teleporter lands on each cell in a single step
+	"""
+	free = numpy.ones(board.size)
+	for t in teleporters:
+		free *= 1 - numpy.array([t.captureProbability(loc) for loc in board.cells])
+	return 1 - free
+
+def valueIteration(border, guards, hidden=(), horizon=None, discount=0.999, tol=1e-9, maxIterations=10000):
+	"""
+	Value Iteration
+
+	Returns (table, value): the best move for every (cell, mask) and the
+	discounted chance of escaping from every cell of the board.
+
+	The discount only breaks ties in favour of escaping sooner.
+	"""
+	if horizon is None:
+		horizon = (2*border + 1)**2 # Rough length of a run
+	inner = kernels.grid(border)
+	outer = kernels.grid(border + 1) # Board plus the ring Billy escapes onto
+
+	occupied = guardHazard(outer, guards, horizon)
+	safe = 1 - teleporterHazard(outer, hidden)
+
+	neighbours = numpy.array([[outer.index((loc[0] + dx, loc[1] + dy)) for dx, dy in OFFSETS] for loc in inner.cells])
+	boardCells = numpy.array([outer.index(loc) for loc in inner.cells])
+
+	# Chance of every mask around every cell
+	bits = (numpy.arange(256)[:, None] >> numpy.arange(8)[None, :]) & 1 # (mask, neighbour)
+	q = occupied[neighbours] # (cell, neighbour)
+	maskProb = numpy.prod(numpy.where(bits[None, :, :], q[:, None, :], 1 - q[:, None, :]), axis=2) # (cell, mask)
+
+	W = numpy.ones(outer.size) # Landing outside the board is an escape
+	for iteration in range(0, maxIterations):
+		Q = numpy.where(bits[None, :, :], 0, discount*(safe*W)[neighbours][:, None, :]) # (cell, mask, move)
+		value = (maskProb*Q.max(axis=2)).sum(axis=1)
+		change = numpy.abs(value - W[boardCells]).max()
+		W[boardCells] = value
+		if change < tol:
+			break
+
+	table = Q.argmax(axis=2).astype(numpy.int8)
+	return table, value
+
+#### Class ####
+
+class policy(object):
+	"""
+	Policy
+
+	Lookup table for Billy's best move, see billy.policyUpdate
+	"""
+	def __init__(self, border, table):
+		self.border = border
+		self.width = 2*border + 1
+		self.table = table
+
+	def choose(self, loc, guards):
+		"""
+		Choose
+
+		Movement for Billy at loc given where the guards are standing
+		"""
+		mask = 0
+		for g in guards:
+			offset = (g.location[0] - loc[0], g.location[1] - loc[1])
+			if offset in BIT:
+				mask |= BIT[offset]
+		cell = (loc[1] + self.border)*self.width + loc[0] + self.border
+		return OFFSETS[self.table[cell, mask]]
+
+def policyTable(border, guards, hidden=(), horizon=None, discount=0.999, cacheDir=CACHE_DIR):
+	"""
+	Policy Table
+
+	Loads the policy for this board and guard line up, building and saving
+	it first if it has not been seen before
+	"""
+	key = repr((VERSION, border, sorted(kernels.describe(g) for g in guards), sorted(kernels.describe(t) for t in hidden), horizon, discount))
+	key = hashlib.sha1(key.encode()).hexdigest()
+	if key not in _tables:
+		path = os.path.join(cacheDir, key + ".npy") if cacheDir else None
+		if path and os.path.exists(path):
+			table = numpy.load(path)
+		else:
+			table, value = valueIteration(border, guards, hidden, horizon, discount)
+			if path:
+				os.makedirs(cacheDir, exist_ok=True)
+				temp = path + ".%d.tmp" % os.getpid()
+				with open(temp, "wb") as f:
+					numpy.save(f, table)
+				os.replace(temp, path) # Other processes never see half a table
+		_tables[key] = policy(border, table)
+	return _tables[key]
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Propagation
+
+Evolves the whole probability distribution of Billy's location, one step
+at a time, instead of sampling one Billy at a time.
+
+Each step follows runSimulation: the guards move, Billy moves with the
+same kernel as billy.randomStep (or smartUpdate), and the mass that lands
+on a guard is caught.  The chance a guard is on a cell comes from its
+exact randomStep chain (kernels.guardChain).  Guards are treated as
+independent of Billy and of each other, which is exact for teleporters
+(they are memoryless) and a mean field approximation for the walking
+guards.  There is no sampling noise.
+
+	python propagation.py [steps]
+"""
+
+import numpy
+import compiler
+import kernels
+
+#### Helper Functions ####
+def supported(S):
+	"""
+	Supported
+
+	Raises an Exception for settings that need more than Billy's kernel
+	and the guards' occupancy
+	"""
+	for name in ("BILLY_SPRINT", "BILLY_LOS", "BILLY_SUPER", "BILLY_OPTIMAL", "WEAPON", "GUARD_LOS", "CENTER_ALARM", "QUARTILE_ALARMS", "GUARD_SPRINT"):
+		if S[name]:
+			raise Exception("Propagation doesn't support", name)
+
+def propagate(scenario=None, steps=2000, tol=1e-12, compiled=None):
+	"""
+	Propagate
+
+	Returns a dictionary with:
+		escaped     escaped[t] = chance Billy has escaped after t+1 steps
+		caught      caught[t]  = chance Billy has been caught after t+1 steps
+		escape      total chance of escaping
+		capture     total chance of being caught
+		remaining   chance still on the board when propagation stopped
+
+	Stops after `steps` steps or once less than tol is left on the board.
+	Pass an already compiled (or attached) scenario as compiled to skip
+	building the tables.
+	"""
+	if compiled is None:
+		compiled = compiler.compileScenario(scenario)
+	S = compiled.settings
+	supported(S)
+	border = S["BORDER"]
+	move = compiled.tables["move"] # Billy's kernel onto board cells then ring cells
+	landing = compiled.tables["landing"] # Column -> outer cell
+	boardSize = move.shape[0]
+	outerSize = (2*border + 3)**2
+
+	# Every guard as a distribution over its chain's states
+	guards = compiled.guards()
+	guardDist = [initial for chain, initial, cells in guards]
+
+	billy = numpy.zeros(boardSize)
+	billy[boardSize//2] = 1 # (0,0)
+	escaped = []
+	caught = []
+	escapeTotal = 0
+	captureTotal = 0
+	for t in range(0, steps):
+		free = numpy.ones(outerSize) # Chance no guard stands on each cell
+		for i, (chain, initial, cells) in enumerate(guards):
+			guardDist[i] = kernels.chainStep(guardDist[i], *chain)
+			occupied = numpy.zeros(outerSize)
+			onGrid = cells >= 0
+			numpy.add.at(occupied, cells[onGrid], guardDist[i][onGrid])
+			free *= 1 - numpy.minimum(occupied, 1)
+
+		moved = billy @ move
+		safe = free[landing]
+		captureTotal += (moved*(1 - safe)).sum()
+		escapeTotal += (moved[boardSize:]*safe[boardSize:]).sum()
+		billy = moved[:boardSize]*safe[:boardSize]
+		escaped.append(escapeTotal)
+		caught.append(captureTotal)
+		if billy.sum() < tol:
+			break
+
+	return {"escaped": numpy.array(escaped), "caught": numpy.array(caught), "escape": escapeTotal, "capture": captureTotal, "remaining": billy.sum()}
+
+def main():
+	from sys import argv
+	steps = 2000
+	if len(argv) > 1:
+		steps = int(argv[1])
+	result = propagate(steps=steps)
+	print("Escape: %.5f\nCaught: %.5f\nStill inside: %.2e" % (result["escape"], result["capture"], result["remaining"]))
+	print("Steps:", len(result["escaped"]))
+	for t in (1, 5, 10, 20, 50, 100):
+		if t <= len(result["escaped"]):
+			print("  after %4d steps: escaped %.4f caught %.4f" % (t, result["escaped"][t-1], result["caught"][t-1]))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Reweight
+
+Likelihood ratio reweighting: one batch of runs, simulated at one
+WEAPON_PROB and SMART_SLOPE, estimates the escape rate over a whole grid
+of those values.
+
+Neither parameter changes which moves are possible, only how likely they
+are, so every run's chance under other values is its chance under the
+simulated ones times a likelihood ratio built from a few counts:
+
+	weapon      draws Billy survived (WEAPON_PROB) and didn't (1 - WEAPON_PROB)
+	smart       smartUpdate steps onto one of the closest border points
+	            (multiplier*slope each) and steps elsewhere, counted by the
+	            points' total multiplier M ((1 - M*slope)/(8 - points) each)
+
+The estimate is the self normalized weighted mean of the outcomes, with
+the effective sample size (sum w)^2/sum w^2 as a health check: far from
+the simulated values the weights degenerate and the ESS drops.
+
+The probability vectors on billy and rook aren't drawn from by any
+current move (randomStep ignores them), so there is nothing to reweight
+there.
+
+	python reweight.py [runs]
+"""
+
+import math
+import numpy
+import simulation
+
+#### Helper Functions ####
+def mismatch(base, target, used):
+	"""
+	Mismatch
+
+	True when target gives weight to draws that base could never make
+	"""
+	return used and not(target == base) and (base <= 0 or base >= 1)
+
+#### Class ####
+
+class trace(object):
+	"""
+	Trace
+
+	Likelihood counts of one run, filled in by billy.smartUpdate and
+	billy.weaponCheck through runSimulation's trace argument
+	"""
+	def __init__(self):
+		self.survived = 0
+		self.failed = 0
+		self.closest = 0 # Smart steps onto a closest border point
+		self.spread = {} # M -> smart steps elsewhere
+
+	def weapon(self, survived):
+		if survived:
+			self.survived += 1
+		else:
+			self.failed += 1
+
+	def smart(self, closest, multipliers):
+		if closest:
+			self.closest += 1
+		else:
+			self.spread[multipliers] = self.spread.get(multipliers, 0) + 1
+
+class batch(object):
+	"""
+	Batch
+
+	Outcomes and likelihood counts of many runs of one scenario
+	"""
+	def __init__(self, scenario, outcomes, traces):
+		self.scenario = simulation.settings(scenario)
+		self.outcomes = numpy.array(outcomes, dtype=float)
+		self.survived = numpy.array([t.survived for t in traces])
+		self.failed = numpy.array([t.failed for t in traces])
+		self.closest = numpy.array([t.closest for t in traces])
+		self.multipliers = sorted(set(M for t in traces for M in t.spread))
+		self.spread = numpy.array([[t.spread.get(M, 0) for M in self.multipliers] for t in traces]).reshape(len(traces), len(self.multipliers))
+
+	@classmethod
+	def simulate(cls, scenario=None, runs=10000):
+		outcomes = []
+		traces = []
+		for i in range(0, runs):
+			t = trace()
+			outcomes.append(simulation.runSimulation(scenario, trace=t))
+			traces.append(t)
+		return cls(scenario, outcomes, traces)
+
+	def logWeights(self, weaponProb=None, slope=None):
+		"""
+		Log Weights
+
+		Log likelihood ratio of every run between the target values and
+		the simulated ones (None keeps a parameter where it was)
+		"""
+		logW = numpy.zeros(len(self.outcomes))
+		with numpy.errstate(divide="ignore", invalid="ignore"): # 0*log(0) terms are dropped by the where
+			if weaponProb is not None:
+				base = self.scenario["WEAPON_PROB"]
+				if not(0 <= weaponProb <= 1):
+					raise Exception("WEAPON_PROB must be between 0 and 1, not", weaponProb)
+				if mismatch(base, weaponProb, (self.survived + self.failed).any()):
+					raise Exception("Can't reweight away from WEAPON_PROB", base)
+				if not(weaponProb == base):
+					logW += numpy.where(self.survived > 0, self.survived*(numpy.log(weaponProb) - numpy.log(base)), 0)
+					logW += numpy.where(self.failed > 0, self.failed*(numpy.log(1 - weaponProb) - numpy.log(1 - base)), 0)
+			if slope is not None:
+				base = self.scenario["SMART_SLOPE"]
+				multipliers = numpy.array(self.multipliers, dtype=float)
+				if slope < 0 or (multipliers*slope > 1).any():
+					raise Exception("SMART_SLOPE", slope, "gives negative smartUpdate probabilities")
+				if not(slope == base):
+					if base <= 0:
+						raise Exception("Can't reweight away from SMART_SLOPE", base)
+					logW += numpy.where(self.closest > 0, self.closest*(numpy.log(slope) - numpy.log(base)), 0)
+					logW += self.spread @ (numpy.log(1 - multipliers*slope) - numpy.log(1 - multipliers*base))
+		return logW
+
+	def estimate(self, weaponProb=None, slope=None):
+		"""
+		Estimate
+
+		Escape rate at the target values as (rate, standard error,
+		effective sample size)
+		"""
+		logW = self.logWeights(weaponProb, slope)
+		w = numpy.exp(logW - logW.max())
+		total = w.sum()
+		rate = (w*self.outcomes).sum()/total
+		error = math.sqrt((w**2*(self.outcomes - rate)**2).sum())/total
+		ess = total**2/(w**2).sum()
+		return rate, error, ess
+
+	def sweep(self, weaponProbs=(None,), slopes=(None,)):
+		"""
+		Sweep
+
+		estimate() over every pair of target values, as a dictionary
+		(weaponProb, slope) -> (rate, error, ess)
+		"""
+		return {(w, s): self.estimate(w, s) for w in weaponProbs for s in slopes}
+
+def main():
+	from sys import argv
+	runs = 5000
+	if len(argv) > 1:
+		runs = int(argv[1])
+	scenario = {"SMART_BILLY": True, "WEAPON": True}
+	simulated = batch.simulate(scenario, runs)
+	print("Simulated %d runs at WEAPON_PROB %.2f, SMART_SLOPE %.3f\n" % (runs, simulated.scenario["WEAPON_PROB"], simulated.scenario["SMART_SLOPE"]))
+	print("WEAPON_PROB  SMART_SLOPE  escaped          ESS")
+	results = simulated.sweep((0.5, 0.6, 0.7, 0.8, 0.9, 1.0), (0.02, 0.03, 0.04, 0.05, 0.06))
+	for (w, s), (rate, error, ess) in results.items():
+		print("   %.2f        %.3f     %.4f +/- %.4f  %6.0f" % (w, s, rate, error, ess))
+
+if __name__ == "__main__":
+	main()
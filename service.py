@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Service
+
+Local simulation service.  One long lived process keeps a pool of warm
+workers (modules imported, kernels built, and the compiled engine's
+tables kept) and answers escape rate queries over a Unix socket, or host:port for
+TCP, one JSON object per line:
+
+	-> {"id": 1, "scenario": {"BORDER": 6}, "runs": 20000, "engine": "packed"}
+	<- {"id": 1, "progress": 0.25}
+	<- ...
+	<- {"id": 1, "result": {"escaped": 9114, "runs": 20000, "rate": 0.4557, "error": 0.0035}, "cached": false}
+
+engine is "reference" (runSimulation, the default), "packed" or
+"compiled" (compiler.playTables, off the worker's compiled tables); an
+optional seed makes the answer reproducible.  Queries for the same
+settings, runs, engine and seed share one evaluation while it runs and
+are answered from an LRU cache afterwards.  Errors come back as
+{"id": ..., "error": "..."}.
+
+	python service.py serve [address] [processes]
+	python service.py query [address] [scenario json] [runs]
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import json
+import math
+import os
+import random as rand
+import signal
+import numpy
+import compiler
+import packed
+import simulation
+
+ADDRESS = ".simulation.sock"
+CHUNK = 2000 # Runs per worker task
+CACHE_SIZE = 1024 # Results kept
+COMPILED_BYTES = 256*2**20 # Compiled tables kept by each worker
+
+ENGINES = { # (scenarioKey, runs) -> how many escaped
+	"reference": lambda key, runs: sum(simulation.runSimulation(settingsFor(key)) for i in range(0, runs)),
+	"packed": lambda key, runs: sum(packed.runPacked(settingsFor(key)) for i in range(0, runs)),
+	"compiled": lambda key, runs: compiler.playTables(compiledFor(key), runs),
+}
+
+_compiled = collections.OrderedDict() # scenarioKey -> compiledScenario, in this worker
+
+#### Helper Functions ####
+def scenarioKey(scenario):
+	"""
+	Scenario Key
+
+	Canonical JSON of the full settings, so equal scenarios share a key
+	however they were written
+	"""
+	return json.dumps(simulation.settings(fromJson(scenario)), sort_keys=True)
+
+def fromJson(scenario):
+	"""
+	From JSON
+
+	Turns the lists JSON makes of locations back into tuples
+	"""
+	scenario = dict(scenario or {})
+	for name, value in scenario.items():
+		if name == "GUARD_PATH":
+			scenario[name] = [tuple(loc) for loc in value]
+		elif isinstance(value, list):
+			scenario[name] = tuple(value)
+	return scenario
+
+def settingsFor(key):
+	return fromJson(json.loads(key))
+
+def warm():
+	"""
+	Warm
+
+	Worker initializer: plays the default scenario once, which imports
+	everything and builds the kernels every scenario shares
+	"""
+	signal.signal(signal.SIGINT, signal.SIG_IGN) # Ctrl-C is for the service, which shuts the pool down
+	simulation.runSimulation()
+	packed.gameFor()
+
+def compiledFor(key):
+	"""
+	Compiled For
+
+	This worker's compiled scenario for a scenarioKey, compiled the first
+	time the compiled engine asks for it.  The most recently used ones are
+	kept, up to COMPILED_BYTES of tables (always at least this one).
+	"""
+	if key in _compiled:
+		_compiled.move_to_end(key)
+	else:
+		_compiled[key] = compiler.compileScenario(settingsFor(key))
+		while len(_compiled) > 1 and sum(c.buffer.nbytes for c in _compiled.values()) > COMPILED_BYTES:
+			_compiled.popitem(last=False)
+	return _compiled[key]
+
+def evaluate(task):
+	"""
+	Evaluate
+
+	Worker: runs one chunk of a query and returns how often Billy escaped
+	"""
+	key, engine, runs, seed = task
+	rand.seed(seed)
+	numpy.random.seed(seed % 2**32)
+	return ENGINES[engine](key, runs)
+
+def connect(address):
+	if ":" in address:
+		host, port = address.rsplit(":", 1)
+		return asyncio.open_connection(host, int(port))
+	return asyncio.open_unix_connection(address)
+
+async def ask(address, queries, progress=None):
+	"""
+	Ask
+
+	Sends queries (dictionaries without ids) over one connection and
+	returns their answers in order.  progress(index, fraction) is called
+	for progress messages.
+	"""
+	reader, writer = await connect(address)
+	try:
+		for i, query in enumerate(queries):
+			writer.write((json.dumps(dict(query, id=i)) + "\n").encode())
+		await writer.drain()
+		answers = {}
+		while len(answers) < len(queries):
+			line = await reader.readline()
+			if not line:
+				raise Exception("Service closed the connection")
+			message = json.loads(line)
+			if "progress" in message:
+				if progress:
+					progress(message["id"], message["progress"])
+			else:
+				answers[message["id"]] = message
+		return [answers[i] for i in range(0, len(queries))]
+	finally:
+		writer.close()
+		await writer.wait_closed()
+
+def query(scenario=None, runs=10000, engine="reference", seed=None, address=ADDRESS, progress=None):
+	"""
+	Query
+
+	Asks a running service for one escape rate.  Returns the result
+	dictionary, or raises an Exception with the service's error.
+	"""
+	request = {"scenario": scenario or {}, "runs": runs, "engine": engine}
+	if seed is not None:
+		request["seed"] = seed
+	answer = asyncio.run(ask(address, [request], progress))[0]
+	if "error" in answer:
+		raise Exception(answer["error"])
+	return answer["result"]
+
+#### Class ####
+
+class job(object):
+	"""
+	Job
+
+	One evaluation in flight, shared by every client asking the same thing
+	"""
+	def __init__(self):
+		self.listeners = [] # Progress callbacks
+		self.done = asyncio.get_running_loop().create_future()
+
+	def report(self, fraction):
+		for listener in list(self.listeners):
+			listener(fraction)
+
+class simulationService(object):
+	"""
+	Simulation Service
+
+	Warm worker pool, in flight deduplication and an LRU result cache
+	"""
+	def __init__(self, processes=None, chunk=CHUNK, cacheSize=CACHE_SIZE):
+		self.pool = concurrent.futures.ProcessPoolExecutor(processes, initializer=warm)
+		self.chunk = chunk
+		self.cacheSize = cacheSize
+		self.cache = collections.OrderedDict() # key -> result
+		self.jobs = {} # key -> job in flight
+
+	async def evaluate(self, scenario, runs, engine="reference", seed=None, progress=None):
+		"""
+		Evaluate
+
+		Escape rate of a scenario as (result, cached)
+		"""
+		if engine not in ENGINES:
+			raise Exception("Unknown engine:", engine)
+		if not(isinstance(runs, int)) or runs < 1:
+			raise Exception("runs must be a positive integer, not", runs)
+		scenario = scenarioKey(scenario)
+		S = fromJson(json.loads(scenario))
+		compiler.validate(S)
+		if engine == "packed":
+			packed.supported(S)
+		if engine == "compiled":
+			compiler.supported(S)
+		key = (scenario, runs, engine, seed)
+		if key in self.cache:
+			self.cache.move_to_end(key)
+			return self.cache[key], True
+
+		if key not in self.jobs:
+			self.jobs[key] = job()
+			asyncio.get_running_loop().create_task(self.run(key))
+		current = self.jobs[key]
+		if progress:
+			current.listeners.append(progress)
+		try:
+			return await asyncio.shield(current.done), False
+		finally:
+			if progress in current.listeners:
+				current.listeners.remove(progress)
+
+	async def run(self, key):
+		scenario, runs, engine, seed = key
+		current = self.jobs[key]
+		tasks = []
+		try:
+			seeds = rand.Random(seed)
+			loop = asyncio.get_running_loop()
+			chunks = [min(self.chunk, runs - first) for first in range(0, runs, self.chunk)]
+			tasks = [loop.run_in_executor(self.pool, evaluate, (scenario, engine, n, seeds.getrandbits(63))) for n in chunks]
+			escaped = 0
+			finished = 0
+			for task in asyncio.as_completed(tasks):
+				escaped += await task
+				finished += 1
+				if finished < len(tasks):
+					current.report(finished/len(tasks))
+			rate = escaped/runs
+			result = {"escaped": escaped, "runs": runs, "rate": rate, "error": math.sqrt(rate*(1 - rate)/runs)}
+			self.cache[key] = result
+			while len(self.cache) > self.cacheSize:
+				self.cache.popitem(last=False)
+			current.done.set_result(result)
+		except Exception as e:
+			for task in tasks:
+				task.cancel()
+			current.done.set_exception(e)
+			current.done.exception() # Marked as retrieved for jobs nobody waits on any more
+		finally:
+			del self.jobs[key]
+
+	async def handle(self, reader, writer):
+		"""
+		Handle
+
+		Serves one client connection; its queries run concurrently
+		"""
+		pending = set()
+
+		def send(message):
+			writer.write((json.dumps(message) + "\n").encode())
+
+		async def answer(message):
+			ident = None
+			try:
+				if not(isinstance(message, dict)):
+					raise Exception("A query must be a JSON object, not", type(message).__name__)
+				ident = message.get("id")
+				result, cached = await self.evaluate(message.get("scenario"), message.get("runs", 10000), message.get("engine", "reference"), message.get("seed"),
+					lambda fraction: send({"id": ident, "progress": fraction}))
+				send({"id": ident, "result": result, "cached": cached})
+			except Exception as e:
+				send({"id": ident, "error": " ".join(str(arg) for arg in e.args)})
+			await writer.drain()
+
+		try:
+			while True:
+				line = await reader.readline()
+				if not line:
+					break
+				try:
+					message = json.loads(line)
+				except ValueError:
+					send({"id": None, "error": "Not JSON"})
+					continue
+				task = asyncio.get_running_loop().create_task(answer(message))
+				pending.add(task)
+				task.add_done_callback(pending.discard)
+			if pending:
+				await asyncio.gather(*pending)
+		except ConnectionError:
+			pass
+		finally:
+			writer.close()
+
+	async def serve(self, address=ADDRESS):
+		"""
+		Serve
+
+		Listens on address until cancelled
+		"""
+		if ":" in address:
+			host, port = address.rsplit(":", 1)
+			server = await asyncio.start_server(self.handle, host, int(port))
+		else:
+			if os.path.exists(address):
+				os.remove(address) # Left behind by a service that died
+			server = await asyncio.start_unix_server(self.handle, address)
+		async with server:
+			await server.serve_forever()
+
+	def close(self):
+		self.pool.shutdown(cancel_futures=True)
+
+def main():
+	from sys import argv
+	command = argv[1] if len(argv) > 1 else "serve"
+	address = argv[2] if len(argv) > 2 else ADDRESS
+	if command == "serve":
+		service = simulationService(int(argv[3]) if len(argv) > 3 else None)
+		print("Serving on", address)
+		try:
+			asyncio.run(service.serve(address))
+		except KeyboardInterrupt:
+			pass
+		finally:
+			service.close()
+	elif command == "query":
+		scenario = json.loads(argv[3]) if len(argv) > 3 else {}
+		runs = int(argv[4]) if len(argv) > 4 else 10000
+		result = query(scenario, runs, address=address, progress=lambda i, fraction: print("  %3.0f%%" % (100*fraction)))
+		print("Escaped: %.4f +/- %.4f (%d runs)" % (result["rate"], result["error"], result["runs"]))
+	else:
+		raise Exception("Unknown command:", command)
+
+if __name__ == "__main__":
+	main()
@@ -11,64 +11,249 @@ This will be the main file that will build and run our simulation
 """
 #from player import *
 import player as p
+import policy as pol
+import kernels
+import heatmap as hm
+import random as rand
 from sys import argv
 
-def runSimulation():
-    # CONSTANTS
-    ###############################################
-
+# CONSTANTS
+###############################################
+SCENARIO = {
     ## Players ##
-    BILLY      = True # Lol don't change this one
-    PERIMGUARD = True
-    PATHGUARD  = False
-    BISHOP     = True
-    ROOK       = True
-    KNIGHT     = True 
-    TELEPORTER = True
+    "BILLY"      : True, # Lol don't change this one
+    "PERIMGUARD" : True,
+    "PATHGUARD"  : False,
+    "BISHOP"     : True,
+    "ROOK"       : True,
+    "KNIGHT"     : True,
+    "TELEPORTER" : True,
+    "TELEPORTERS": 1, # Number of teleporters
 
     ## Powers ##
-    BILLY_SPRINT = False
-    SMART_BILLY  = False
-    BILLY_LOS    = False
-    BILLY_SUPER  = False
-    WEAPON       = False 
+    "BILLY_SPRINT" : False,
+    "SMART_BILLY"  : False,
+    "BILLY_LOS"    : False,
+    "BILLY_SUPER"  : False,
+    "BILLY_OPTIMAL": False, # Precomputed escape policy, see policy.py
+    "WEAPON"       : False,
+
+    "GUARD_LOS"       : False,
+    "CENTER_ALARM"    : False,
+    "QUARTILE_ALARMS" : False,
+    "GUARD_SPRINT"    : False,
 
-    GUARD_LOS       = False 
-    CENTER_ALARM    = False 
-    QUARTILE_ALARMS = False 
-    GUARD_SPRINT    = False
+    ## Fast Paths ##
+    "TELEPORTER_HAZARD" : True, # Replace teleporter steps with their exact capture chance
+    "LEAPFROG"          : False, # Skip several steps at once while every guard is far from Billy (pays off on big boards)
+    "LEAPFROG_STEPS"    : 8, # Most steps skipped in one jump
+    "LAZY_GUARDS"       : False, # Stop stepping guards Billy can't reach for a while, catch them up later (pays off on big boards)
+    "EARLY_EXIT"        : False, # Credit Billy's exact chance of leaving before any guard can reach him; runs return that chance, not 0 or 1
+    "EARLY_EXIT_STEPS"  : 32, # Most steps credited at once
+    "EARLY_EXIT_CUTOFF" : 0.05, # Runs whose remaining chance drops below this play on at this weight or stop
 
     ### More Constants ###
-    BORDER = 4 # Distance from center
+    "BORDER" : 4, # Distance from center
 
     ### Alarm Params ###
-    CENTER_ALARM_TRIGGERED = False   
-    ALARM_BORDER           = 1
-    ALARM_CENTER_LOCATION  = (0,0)
+    "CENTER_ALARM_TRIGGERED" : False,
+    "ALARM_BORDER"           : 1,
+    "ALARM_CENTER_LOCATION"  : (0,0),
 
-    QUARTILE_1_TRIGGER     = False
-    QUARTILE_1_LOCATION    = (-2, -2)
+    "QUARTILE_1_TRIGGER"     : False,
+    "QUARTILE_1_LOCATION"    : (-2, -2),
 
-    QUARTILE_2_TRIGGER     = False
-    QUARTILE_2_LOCATION    = (-2, 2)
+    "QUARTILE_2_TRIGGER"     : False,
+    "QUARTILE_2_LOCATION"    : (-2, 2),
 
-    QUARTILE_3_TRIGGER     = False
-    QUARTILE_3_LOCATION    = (2, 2)
+    "QUARTILE_3_TRIGGER"     : False,
+    "QUARTILE_3_LOCATION"    : (2, 2),
 
-    QUARTILE_4_TRIGGER     = False
-    QUARTILE_4_LOCATION    = (2, -2)
+    "QUARTILE_4_TRIGGER"     : False,
+    "QUARTILE_4_LOCATION"    : (2, -2),
 
     ## Player Specific Constants ##
-    SQUARE_GUARD_PATROL_BORDER = 5
-    GUARD_PATH = [(1,1),(2,1),(1,2),(2,2),(1,3),(0,4),(0,3),(-1,2),(-1,1),(-1,0),(-1,-1),(0,-1)]
-    CHANGE_IN_PROB = 0.1
-    WEAPON_PROB = 0.8
-    ######################################################
+    "SQUARE_GUARD_PATROL_BORDER" : 5,
+    "GUARD_PATH" : [(1,1),(2,1),(1,2),(2,2),(1,3),(0,4),(0,3),(-1,2),(-1,1),(-1,0),(-1,-1),(0,-1)],
+    "CHANGE_IN_PROB" : 0.1,
+    "WEAPON_PROB" : 0.8,
+    "SMART_SLOPE" : 0.04, # How much more likely smart Billy heads for the border per ring out (billy.smartUpdate p)
+}
+######################################################
+
+def settings(scenario=None):
+    """
+    Settings
+
+    SCENARIO with the constants in scenario swapped in
+    """
+    S = dict(SCENARIO)
+    if scenario:
+        for name in scenario:
+            if name not in SCENARIO:
+                raise Exception("Unknown scenario constant:", name)
+        S.update(scenario)
+    return S
+
+def startSpaces(scenario=None):
+    """
+    Start Spaces
+
+    Equally likely starting locations of each guard, mirroring the guard
+    constructors, in the order runSimulation's start argument takes them
+    """
+    S = settings(scenario)
+    BORDER = S["BORDER"]
+    board = [(x,y) for x in range(-BORDER, BORDER+1) for y in range(-BORDER, BORDER+1) if not((x,y) == (0,0))]
+    spaces = []
+    if S["PERIMGUARD"]:
+        spaces.append([(x,y) for x in (-BORDER, BORDER) for y in (-BORDER, BORDER)])
+    if S["PATHGUARD"]:
+        spaces.append(list(S["GUARD_PATH"]))
+    for name in ("BISHOP", "ROOK", "KNIGHT"):
+        if S[name]:
+            spaces.append(board)
+    if S["TELEPORTER"]:
+        for i in range(0, S["TELEPORTERS"]):
+            spaces.append(board)
+    return spaces
+
+def earlyExitSupported(S):
+    """
+    Early Exit Supported
+
+    Raises an Exception for settings EARLY_EXIT turns itself off for.
+    runSimulation also turns it off for recorders, traces and replays.
+    """
+    for name in ("BILLY_LOS", "BILLY_SUPER", "BILLY_OPTIMAL", "BILLY_SPRINT", "GUARD_SPRINT", "CENTER_ALARM", "QUARTILE_ALARMS"):
+        if S[name]:
+            raise Exception("EARLY_EXIT doesn't support", name)
+    if S["TELEPORTER"] and not(hazardMode(S)):
+        raise Exception("EARLY_EXIT needs teleporters on the hazard fast path")
+
+def smartSlopeCheck(S):
+    """
+    Smart Slope Check
+
+    Raises an Exception if smart Billy's SMART_SLOPE gives negative
+    smartUpdate probabilities somewhere he can call it from: the board,
+    or past it when he sprints (the second billyUpdate starts wherever
+    the first left him, one move out or two with BILLY_LOS)
+    """
+    if S["SMART_BILLY"]:
+        slope = S["SMART_SLOPE"]
+        radius = S["BORDER"]
+        if S["BILLY_SPRINT"]:
+            radius += 2 if S["BILLY_LOS"] else 1
+        reach = kernels.smartReach(S["BORDER"], radius)
+        if slope < 0 or slope*reach > 1:
+            raise Exception("SMART_SLOPE", slope, "gives negative smartUpdate probabilities on BORDER", S["BORDER"], "(it takes at most %g)" % (1/reach))
+
+def hazardMode(S):
+    # Teleporters only matter through checkCaught unless Billy or an alarm looks at them
+    return S["TELEPORTER_HAZARD"] and not(S["BILLY_LOS"] or S["BILLY_SUPER"] or S["WEAPON"] or S["CENTER_ALARM"])
+
+def makeGuards(S):
+    """
+    Make Guards
+
+    Instantiates every guard of a scenario, in startSpaces order
+    """
+    BORDER = S["BORDER"]
+    guards = []
+    if S["PERIMGUARD"]:
+        guards.append(p.squareGuard(BORDER))
+    if S["PATHGUARD"]:
+        guards.append(p.pathGuard(S["GUARD_PATH"], BORDER))
+    if S["BISHOP"]:
+        guards.append(p.bishop(BORDER))
+    if S["ROOK"]:
+        guards.append(p.rook(BORDER, S["CHANGE_IN_PROB"]))
+    if S["KNIGHT"]:
+        guards.append(p.knight(BORDER))
+    if S["TELEPORTER"]:
+        for i in range(0, S["TELEPORTERS"]):
+            guards.append(p.teleporter(BORDER))
+    return guards
+
+def runSimulation(scenario=None, record=None, start=None, replay=None, trace=None):
+    """
+    Run Simulation
+
+    Runs one escape attempt and returns 1 if Billy escaped, 0 if he was caught
+    (with EARLY_EXIT, his chance of escaping given how the run went)
+        scenario   dictionary of SCENARIO constants to change
+        record     optional recorder, e.g. heatmap.heatmap, told about
+                   every step (record.step) and how the run ended (record.finish).
+                   Leapfrog stays off unless the recorder sets jumps = True,
+                   then a jump is one record.step(billy, steps) call.
+        start      optional starting location for each guard, ordered as in
+                   startSpaces.  None leaves that guard's start random.
+        replay     optional guard trajectory (see trajectories.py): locations
+                   of the moving guards at the start and after each guard
+                   step.  Guards go back to random steps if it runs out.
+        trace      optional reweight.trace, told about every draw that
+                   WEAPON_PROB and SMART_SLOPE go into
+    """
+    S = settings(scenario)
+    BILLY                      = S["BILLY"]
+    PERIMGUARD                 = S["PERIMGUARD"]
+    PATHGUARD                  = S["PATHGUARD"]
+    BISHOP                     = S["BISHOP"]
+    ROOK                       = S["ROOK"]
+    KNIGHT                     = S["KNIGHT"]
+    TELEPORTER                 = S["TELEPORTER"]
+    TELEPORTERS                = S["TELEPORTERS"]
+    BILLY_SPRINT               = S["BILLY_SPRINT"]
+    SMART_BILLY                = S["SMART_BILLY"]
+    BILLY_LOS                  = S["BILLY_LOS"]
+    BILLY_SUPER                = S["BILLY_SUPER"]
+    BILLY_OPTIMAL              = S["BILLY_OPTIMAL"]
+    WEAPON                     = S["WEAPON"]
+    GUARD_LOS                  = S["GUARD_LOS"]
+    CENTER_ALARM               = S["CENTER_ALARM"]
+    QUARTILE_ALARMS            = S["QUARTILE_ALARMS"]
+    GUARD_SPRINT               = S["GUARD_SPRINT"]
+    TELEPORTER_HAZARD          = S["TELEPORTER_HAZARD"]
+    LEAPFROG                   = S["LEAPFROG"]
+    LEAPFROG_STEPS             = S["LEAPFROG_STEPS"]
+    LAZY_GUARDS                = S["LAZY_GUARDS"]
+    EARLY_EXIT                 = S["EARLY_EXIT"]
+    EARLY_EXIT_STEPS           = S["EARLY_EXIT_STEPS"]
+    EARLY_EXIT_CUTOFF          = S["EARLY_EXIT_CUTOFF"]
+    BORDER                     = S["BORDER"]
+    CENTER_ALARM_TRIGGERED     = S["CENTER_ALARM_TRIGGERED"]
+    ALARM_BORDER               = S["ALARM_BORDER"]
+    ALARM_CENTER_LOCATION      = S["ALARM_CENTER_LOCATION"]
+    QUARTILE_1_TRIGGER         = S["QUARTILE_1_TRIGGER"]
+    QUARTILE_1_LOCATION        = S["QUARTILE_1_LOCATION"]
+    QUARTILE_2_TRIGGER         = S["QUARTILE_2_TRIGGER"]
+    QUARTILE_2_LOCATION        = S["QUARTILE_2_LOCATION"]
+    QUARTILE_3_TRIGGER         = S["QUARTILE_3_TRIGGER"]
+    QUARTILE_3_LOCATION        = S["QUARTILE_3_LOCATION"]
+    QUARTILE_4_TRIGGER         = S["QUARTILE_4_TRIGGER"]
+    QUARTILE_4_LOCATION        = S["QUARTILE_4_LOCATION"]
+    SQUARE_GUARD_PATROL_BORDER = S["SQUARE_GUARD_PATROL_BORDER"]
+    GUARD_PATH                 = S["GUARD_PATH"]
+    CHANGE_IN_PROB             = S["CHANGE_IN_PROB"]
+    WEAPON_PROB                = S["WEAPON_PROB"]
+    SMART_SLOPE                = S["SMART_SLOPE"]
+
+    smartSlopeCheck(S)
 
     Guards = []
     LineOSGuards = []
+    Teleporters = []
     quartileAlarms = []
 
+    HAZARD = hazardMode(S)
+    missed = [] # Capture chance already ruled out for each teleporter since its last jump
+    caughtBy = [] # Class name of whatever caught Billy, for the recorder
+    Active = Guards # Guards being stepped (all of them unless LAZY)
+    frozen = {} # Lazy guard -> (tick it froze after, last tick it is safe)
+    credit = [0] # Escape chance credited by earlyExit so far
+    weight = [1] # Chance of the runs still being played out
+
     # Simulation Update Functions
     def guardLosUpdate(*guard):
         for g in guard:
@@ -76,7 +261,7 @@ def runSimulation():
         
     def billyUpdate(billy, guards):
         if SMART_BILLY:
-                billy.smartUpdate()
+                billy.smartUpdate(p=SMART_SLOPE)
                 billy.weaponCheck(guards, p=WEAPON_PROB)
                 #caughtHuh(billy, guards)
         if BILLY_LOS:
@@ -85,7 +270,10 @@ def runSimulation():
         if BILLY_SUPER:
             billy.superBilly(guards) 
             billy.weaponCheck(guards, p=WEAPON_PROB)
-        elif not(SMART_BILLY or BILLY_LOS or BILLY_SUPER):
+        if BILLY_OPTIMAL:
+            billy.policyUpdate(policy, guards)
+            billy.weaponCheck(guards, p=WEAPON_PROB)
+        elif not(SMART_BILLY or BILLY_LOS or BILLY_SUPER or BILLY_OPTIMAL):
             billy.randomStep()
             billy.weaponCheck(guards, p=WEAPON_PROB)
 
@@ -97,14 +285,151 @@ def runSimulation():
                 if QUARTILE_ALARMS:
                     for alarm in quartileAlarms:
                         alarm.billyCheck(billy)
-                    teleporter.quartileAlarmMove(quartile1, quartile2, quartile3, quartile4)
-                else:
-                    teleporter.randomStep()
+                for teleporter in Teleporters:
+                    if QUARTILE_ALARMS and HAZARD:
+                        for alarm in quartileAlarms:
+                            teleporter.alarmCheck(alarm)
+                    elif QUARTILE_ALARMS:
+                        teleporter.quartileAlarmMove(quartile1, quartile2, quartile3, quartile4)
+                    elif not(HAZARD):
+                        teleporter.randomStep()
             if KNIGHT:
                 knight.randomStep()
         else:
-            for guard in Guards:
-                guard.randomStep()
+            tick = next(replay, None) if replay else None
+            if tick is None:
+                for guard in guards:
+                    guard.randomStep()
+            else:
+                for guard, loc in zip(Guards, tick):
+                    place(guard, loc)
+        missed[:] = [0]*len(Teleporters) # Every teleporter has jumped again
+
+    def place(guard, loc):
+        guard.setLocation(loc)
+        if isinstance(guard, p.pathGuard):
+            guard.index = guard.trail.index(loc)
+
+    def teleporterHazard(billy):
+        """
+        Teleporter Hazard
+
+        Chance that some teleporter sits on Billy's cell, given that none of them
+        sat on a cell already checked since their last jump (Billy sprint checks twice)
+        """
+        survive = 1
+        for i in range(0, len(Teleporters)):
+            q = Teleporters[i].captureProbability(billy.location)
+            if q:
+                survive *= 1 - q/(1 - missed[i])
+                missed[i] += q
+        return 1 - survive
+
+    def hazardAt(loc):
+        survive = 1
+        for teleporter in Teleporters:
+            survive *= 1 - teleporter.captureProbability(loc)
+        return 1 - survive
+
+    def leapfrog(billy):
+        """
+        Leapfrog
+
+        Jumps up to LEAPFROG_STEPS steps at once when no guard can reach Billy
+        (or see him, with GUARD_LOS) in that time and he can't reach the border.
+        Billy moves by kernels.billyDisplacement, which is exact that far from
+        the border; nearer it he steps as usual, with out of bounds checked on
+        every step.  The guards jump with their exact k step chains, and
+        teleporters count through their capture chance on each skipped check.
+
+        Returns how many steps it stood in for (0 if it didn't jump)
+        """
+        steps = min(LEAPFROG_STEPS, BORDER - max(abs(billy.locX()), abs(billy.locY())))
+        if steps < 2:
+            return 0
+        for guard, speed in zip(Guards, speeds):
+            gap = max(abs(guard.locX() - billy.locX()), abs(guard.locY() - billy.locY()))
+            steps = min(steps, (gap - margin - 1)//(speed + 1))
+            if steps < 2:
+                return 0
+
+        movements, cumulative = kernels.billyDisplacement(steps)
+        billy.move(movements[kernels.sample(cumulative)])
+        for guard, chain in zip(Guards, chains):
+            chain.advance(guard, steps)
+
+        if HAZARD and rand.random() >= (1 - hazardAt(billy.location))**steps: # Same on every cell of the board
+            billy.CAUGHT = True
+            caughtBy.append("teleporter")
+        return steps
+
+    def earlyExit(billy):
+        """
+        Early Exit
+
+        When no guard can reach Billy within some steps (up to EARLY_EXIT_STEPS),
+        credits the exact chance that he leaves the board in that time, dodging the
+        teleporters, from kernels.exitTable.  Play carries on with the runs where he
+        didn't: Billy is drawn from where he can be after those steps still on the
+        board, and the guards jump with their exact k step chains.  Once that weight
+        drops below EARLY_EXIT_CUTOFF it goes on at the cutoff with matching odds, or
+        the run stops (Russian roulette).
+
+        Returns how many steps it stood in for (0 if it didn't jump)
+        """
+        steps = EARLY_EXIT_STEPS
+        for guard, speed in zip(Guards, exitSpeeds):
+            gap = max(abs(guard.locX() - billy.locX()), abs(guard.locY() - billy.locY()))
+            steps = min(steps, (gap - exitMargin - 1)//(speed + 1))
+            if steps < 2: # A single step is cheaper played out
+                return 0
+
+        cell = exits.grid.index(billy.location)
+        inside = 1 - hazardAt(billy.location) if HAZARD else 1 # Same on every cell of the board
+        credit[0] += weight[0]*exits.left(cell, steps, inside)
+        weight[0] *= exits.stay[steps, cell]*inside**steps
+        if weight[0] < EARLY_EXIT_CUTOFF:
+            if rand.random()*EARLY_EXIT_CUTOFF < weight[0]:
+                weight[0] = EARLY_EXIT_CUTOFF
+            else:
+                weight[0] = 0
+                return steps
+
+        billy.setLocation(exits.grid.cells[exits.walk(cell, steps)])
+        for guard, chain in zip(Guards, exitChains):
+            chain.advance(guard, steps)
+        return steps
+
+    def freezeGuards(billy, tick):
+        """
+        Freeze Guards
+
+        Stops stepping every guard that can't reach Billy (or be seen by him)
+        for at least two ticks, whatever either of them does
+        """
+        for guard in list(Active):
+            gap = max(abs(guard.locX() - billy.locX()), abs(guard.locY() - billy.locY()))
+            ticks = (gap - lazyMargin - 1)//(lazySpeeds[guard]*guardSteps + billySteps)
+            if ticks >= 2:
+                frozen[guard] = (tick, tick + ticks)
+                Active.remove(guard)
+
+    def wakeGuards(tick):
+        """
+        Wake Guards
+
+        Catches up every frozen guard that could reach Billy this tick with
+        one draw from its exact multi step distribution.  Nothing looked at
+        it while it was frozen, so this is the same as having stepped it.
+        """
+        woken = False
+        for guard, (froze, safe) in list(frozen.items()):
+            if tick > safe:
+                lazyChains[guard].advance(guard, (tick - 1 - froze)*guardSteps)
+                del frozen[guard]
+                woken = True
+        if woken:
+            Active[:] = [guard for guard in Guards if guard not in frozen] # Same order as Guards
 
     def checkCaught(billy, guards):
         billLoc = billy.location
@@ -113,6 +438,11 @@ def runSimulation():
           #  print("     guard:", guard.location)
             if guard.location == billLoc:
                 billy.CAUGHT = True
+                caughtBy.append(type(guard).__name__)
+        if HAZARD and not(billy.CAUGHT):
+            if rand.random() < teleporterHazard(billy):
+                billy.CAUGHT = True
+                caughtBy.append("teleporter")
 
     # Simulation
     #Instantiate Players
@@ -120,30 +450,18 @@ def runSimulation():
         billy = p.billy(BORDER)
         if WEAPON:
             billy.weapon = WEAPON
-    if PERIMGUARD:
-        perimGuard = p.squareGuard(BORDER)
-        Guards.append(perimGuard)
-        LineOSGuards.append(perimGuard)
-    if PATHGUARD:
-        pathGuard = p.pathGuard(GUARD_PATH, BORDER) 
-        Guards.append(pathGuard)
-        LineOSGuards.append(pathGuard)
-    if BISHOP:
-        bishop = p.bishop(BORDER)
-        Guards.append(bishop)
-        LineOSGuards.append(bishop)
-    if ROOK:
-        rook = p.rook(BORDER, CHANGE_IN_PROB)
-        Guards.append(rook)
-        LineOSGuards.append(rook)
-    if KNIGHT:
-        knight = p.knight(BORDER)
-        Guards.append(knight)
-        # No line of sight
-    if TELEPORTER:
-        teleporter = p.teleporter(BORDER)
-        Guards.append(teleporter)
-        # No line of sight
+        billy.trace = trace
+    for guard in makeGuards(S):
+        if isinstance(guard, p.teleporter):
+            Teleporters.append(guard) # No line of sight
+        elif isinstance(guard, p.knight):
+            knight = guard
+            Guards.append(knight) # No line of sight
+        else:
+            Guards.append(guard)
+            LineOSGuards.append(guard)
+    if not(HAZARD):
+        Guards.extend(Teleporters)
     if CENTER_ALARM:
         alarmCenter = p.centerAlarm(ALARM_BORDER, ALARM_CENTER_LOCATION, CENTER_ALARM_TRIGGERED)
     if QUARTILE_ALARMS:
@@ -153,8 +471,82 @@ def runSimulation():
         quartile4 = p.quartileAlarm(QUARTILE_4_LOCATION, QUARTILE_4_TRIGGER)
         quartileAlarms.extend((quartile1, quartile2, quartile3, quartile4))
 
+    if start:
+        everyone = Guards + Teleporters if HAZARD else Guards
+        for guard, loc in zip(everyone, start):
+            if loc is not None:
+                place(guard, loc)
+
+    if replay:
+        if GUARD_LOS or QUARTILE_ALARMS:
+            raise Exception("Guards can only be replayed when they ignore Billy")
+        replay = iter(replay)
+        for guard, loc in zip(Guards, next(replay)):
+            place(guard, loc)
+
+    if BILLY_OPTIMAL:
+        if HAZARD:
+            policy = pol.policyTable(BORDER, Guards, Teleporters)
+        else:
+            policy = pol.policyTable(BORDER, Guards)
+
+    # Early exit needs Billy's random or smart walk, no sprints, no alarms and nobody watching the steps it skips
+    EARLY = EARLY_EXIT and not(record or trace or replay)
+    if EARLY:
+        try:
+            earlyExitSupported(S)
+        except Exception:
+            EARLY = False
+    if EARLY:
+        exits = kernels.exitTableFor(BORDER, SMART_BILLY, SMART_SLOPE, EARLY_EXIT_STEPS)
+        exitChains = [kernels.chainFor(g) for g in Guards]
+        exitSpeeds = [c.speed() for c in exitChains]
+        exitMargin = 2 if GUARD_LOS else 0 # Line of sight guards react to Billy's perimeter
+        if float("inf") in exitSpeeds: # Teleporters outside the hazard fast path
+            EARLY = False
+        for teleporter in Teleporters:
+            if tuple(teleporter.center) != (0, 0) or teleporter.border != BORDER:
+                EARLY = False # Hazard differs from cell to cell, or reaches the cells Billy leaves to
+
+    # Leapfrog needs Billy's plain random walk, no sprints, no alarms and a recorder that doesn't need every cell
+    LEAP = LEAPFROG and not(EARLY or replay or (record and not(getattr(record, "jumps", False))) or SMART_BILLY or BILLY_LOS or BILLY_SUPER or BILLY_OPTIMAL or BILLY_SPRINT or GUARD_SPRINT or CENTER_ALARM or QUARTILE_ALARMS)
+    if LEAP:
+        chains = [kernels.chainFor(g) for g in Guards]
+        speeds = [c.speed() for c in chains]
+        margin = 2 if GUARD_LOS else 0 # Line of sight guards react to Billy's perimeter
+        if float("inf") in speeds: # Teleporters outside the hazard fast path
+            LEAP = False
+        for teleporter in Teleporters:
+            if abs(teleporter.center[0]) + BORDER > teleporter.border or abs(teleporter.center[1]) + BORDER > teleporter.border:
+                LEAP = False # Hazard differs from cell to cell
+
+    # Lazy guards need guards that ignore Billy and nothing else watching them
+    LAZY = LAZY_GUARDS and not(LEAP or EARLY or replay or GUARD_LOS or BILLY_OPTIMAL or CENTER_ALARM or QUARTILE_ALARMS)
+    if LAZY:
+        lazyChains = {guard: kernels.chainFor(guard) for guard in Guards}
+        lazySpeeds = {guard: lazyChains[guard].speed() for guard in Guards}
+        lazyMargin = 2 if (BILLY_LOS or BILLY_SUPER) else 0 # Billy's line of sight reacts to guards next to his perimeter
+        guardSteps = 2 if GUARD_SPRINT else 1
+        billySteps = 2 if BILLY_SPRINT else 1
+        Active = list(Guards)
+    tick = 0
+
     # Running Updates
     while(not(billy.CAUGHT) and not(billy.OutOfBounds)):
+        tick += 1
+        if LAZY:
+            wakeGuards(tick)
+        if EARLY and earlyExit(billy):
+            if weight[0] == 0:
+                break
+            continue
+        if LEAP:
+            taken = leapfrog(billy)
+            if taken:
+                if record:
+                    record.step(billy, taken)
+                continue
+
         # Alarm Set up
         if CENTER_ALARM:
             if alarmCenter.guardCheck(Guards):
@@ -166,23 +558,36 @@ def runSimulation():
                     GUARD_SPRINT = True
         
         if GUARD_SPRINT:
-            guardUpdate(billy, Guards)
-            checkCaught(billy, Guards)
-            guardUpdate(billy, Guards)
+            guardUpdate(billy, Active)
+            checkCaught(billy, Active)
+            guardUpdate(billy, Active)
         else:
-            guardUpdate(billy, Guards)
+            guardUpdate(billy, Active)
 
         # Billy Update
         if BILLY_SPRINT:
-            billyUpdate(billy, Guards)
-            checkCaught(billy, Guards)
-            billyUpdate(billy, Guards)
+            billyUpdate(billy, Active)
+            checkCaught(billy, Active)
+            billyUpdate(billy, Active)
         else:
-            billyUpdate(billy, Guards)
+            billyUpdate(billy, Active)
 
-        checkCaught(billy, Guards)
+        checkCaught(billy, Active)
+        if LAZY:
+            freezeGuards(billy, tick)
+        if record:
+            record.step(billy)
     
     # Final Check
+    if record:
+        if billy.CAUGHT:
+            record.finish(billy, caughtBy[0] if caughtBy else "trapped") # Line of sight Billy with nowhere to go
+        else:
+            record.finish(billy, None)
+    if EARLY:
+        if billy.OutOfBounds and not(billy.CAUGHT):
+            return float(credit[0] + weight[0])
+        return float(credit[0])
     if billy.CAUGHT:
         return 0
     if billy.OutOfBounds:
@@ -197,17 +602,17 @@ def main():
     else:
         SIMULATION_ITERATIONS = Sims
 
+    record = None
+    if len(argv) > 2: # Save heatmaps here
+        record = hm.heatmap(SCENARIO["BORDER"])
 
     escaped = 0
-    caught = 0
     for i in range(0, SIMULATION_ITERATIONS):
-        x = runSimulation()
-        if x == 0:
-            caught += 1
-        elif x == 1:
-            escaped += 1
-    print("Caught:", caught, "\nEscaped:", escaped)
+        escaped += runSimulation(record=record) # A fraction with EARLY_EXIT
+    print("Caught:", SIMULATION_ITERATIONS - escaped, "\nEscaped:", escaped)
     print("\nNumber of Simulations:", SIMULATION_ITERATIONS)
+    if record:
+        record.save(argv[2])
 
 if __name__ == "__main__":
     main()
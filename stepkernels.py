@@ -0,0 +1,583 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Step Kernels
+
+The per step moves of player.py written as array in, array out kernels
+over a batch of runs, compiled by numba when it is installed and run as
+the same NumPy code when it isn't:
+
+	billyStep      billy.randomStep
+	smartStep      billy.smartUpdate, from a table of kernels.smartMoves
+	sightStep      billy.lineOfSight (abstractLineOfSight)
+	movementStep   guard.randomMove_from_movements (bishop, rook)
+	knightStep     knight.randomStep
+	trailStep      pathGuard.randomStep, and the square guard's ring
+	boxStep        teleporter.randomStep
+	caughtBy       runSimulation's checkCaught
+
+Kernels take their uniform draws as arrays, so both backends give the
+same answer for the same draws.  sweepGame plays packed.packedGame's
+game on them (plus WEAPON), one kernel call per guard per step for every
+run still going.  Its runs can come from different scenarios: BORDER,
+guards, powers and WEAPON_PROB are looked up per run, so a small sweep
+plays as one batch.
+
+	python stepkernels.py [runs]
+
+prints the backend and benchmarks each kernel and the batch engine.
+"""
+
+import time
+import numpy
+import kernels
+import packed
+import simulation
+
+try:
+	import numba
+	BACKEND = "numba " + numba.__version__
+	jit = numba.njit(cache=True)
+except ImportError:
+	numba = None
+	BACKEND = "numpy"
+	def jit(function):
+		return function
+
+MOVES = 8 # Width of the smartStep tables
+BILLY_DX = numpy.array([dx for dx, dy in packed.BILLY_MOVES], dtype=numpy.int64)
+BILLY_DY = numpy.array([dy for dx, dy in packed.BILLY_MOVES], dtype=numpy.int64)
+KNIGHT_DX = numpy.array([dx for dx, dy in packed.KNIGHT_MOVES], dtype=numpy.int64)
+KNIGHT_DY = numpy.array([dy for dx, dy in packed.KNIGHT_MOVES], dtype=numpy.int64)
+EIGHT_DX = numpy.array([dx for dx, dy in packed.EIGHT], dtype=numpy.int64)
+EIGHT_DY = numpy.array([dy for dx, dy in packed.EIGHT], dtype=numpy.int64)
+BISHOP = (numpy.array([dx for dx, dy in packed.BISHOP_MOVES], dtype=numpy.int64), numpy.array([dy for dx, dy in packed.BISHOP_MOVES], dtype=numpy.int64))
+ROOK = (numpy.array([dx for dx, dy in packed.ROOK_MOVES], dtype=numpy.int64), numpy.array([dy for dx, dy in packed.ROOK_MOVES], dtype=numpy.int64))
+
+_games = {} # sweepGame for each tuple of gameKey
+
+#### Kernels ####
+@jit
+def billyStep(x, y, u):
+	"""
+	Billy Step
+
+	billy.randomStep from (x, y), u uniform in [0, 1)
+	"""
+	k = (u*18).astype(numpy.int64)
+	return x + BILLY_DX[k], y + BILLY_DY[k]
+
+@jit
+def smartStep(x, y, u, radius, offset, dx, dy, cumulative):
+	"""
+	Smart Step
+
+	billy.smartUpdate from (x, y).  Row offset + (x + radius) + (y +
+	radius)*width of the flat tables holds MOVES moves and their
+	cumulative probabilities.
+	"""
+	base = (offset + (x + radius) + (y + radius)*(2*radius + 1))*MOVES
+	target = u*cumulative[base + MOVES - 1]
+	nx = x.copy()
+	ny = y.copy()
+	chosen = numpy.zeros(len(x), dtype=numpy.bool_)
+	for j in range(0, MOVES):
+		pick = ~chosen & (target < cumulative[base + j])
+		nx = numpy.where(pick, x + dx[base + j], nx)
+		ny = numpy.where(pick, y + dy[base + j], ny)
+		chosen = chosen | pick
+	return nx, ny
+
+@jit
+def sightStep(x, y, u, gx, gy):
+	"""
+	Sight Step
+
+	billy.lineOfSight from (x, y): a neighbour that isn't next to any
+	guard (rows of gx, gy), or trapped where there is none
+	"""
+	n = len(x)
+	legal = numpy.empty((MOVES, n), dtype=numpy.bool_)
+	count = numpy.zeros(n, dtype=numpy.int64)
+	for j in range(0, MOVES):
+		tx = x + EIGHT_DX[j]
+		ty = y + EIGHT_DY[j]
+		free = numpy.ones(n, dtype=numpy.bool_)
+		for g in range(0, gx.shape[0]):
+			free = free & ~(numpy.maximum(numpy.abs(tx - gx[g]), numpy.abs(ty - gy[g])) == 1)
+		legal[j] = free
+		count += free.astype(numpy.int64)
+	k = (u*count).astype(numpy.int64)
+	nx = x.copy()
+	ny = y.copy()
+	seen = numpy.zeros(n, dtype=numpy.int64)
+	for j in range(0, MOVES):
+		pick = legal[j] & (seen == k)
+		nx = numpy.where(pick, x + EIGHT_DX[j], nx)
+		ny = numpy.where(pick, y + EIGHT_DY[j], ny)
+		seen += legal[j].astype(numpy.int64)
+	return nx, ny, count == 0
+
+@jit
+def movementStep(x, y, u, dx, dy, border):
+	"""
+	Movement Step
+
+	guard.randomMove_from_movements from (x, y): one of the movements
+	(dx, dy) that stays within the border, each equally likely
+	"""
+	n = len(x)
+	count = numpy.zeros(n, dtype=numpy.int64)
+	for j in range(0, len(dx)):
+		count += ((numpy.abs(x + dx[j]) <= border) & (numpy.abs(y + dy[j]) <= border)).astype(numpy.int64)
+	k = (u*count).astype(numpy.int64)
+	nx = x.copy()
+	ny = y.copy()
+	seen = numpy.zeros(n, dtype=numpy.int64)
+	for j in range(0, len(dx)):
+		tx = x + dx[j]
+		ty = y + dy[j]
+		legal = (numpy.abs(tx) <= border) & (numpy.abs(ty) <= border)
+		pick = legal & (seen == k)
+		nx = numpy.where(pick, tx, nx)
+		ny = numpy.where(pick, ty, ny)
+		seen += legal.astype(numpy.int64)
+	return nx, ny
+
+@jit
+def knightStep(x, y, u):
+	"""
+	Knight Step
+
+	knight.randomStep from (x, y), with no border check
+	"""
+	k = (u*8).astype(numpy.int64)
+	return x + KNIGHT_DX[k], y + KNIGHT_DY[k]
+
+@jit
+def trailStep(index, u, length):
+	"""
+	Trail Step
+
+	pathGuard.randomStep: one step either way along a trail of length
+	"""
+	return (index + 2*(u < 0.5).astype(numpy.int64) - 1) % length
+
+@jit
+def boxStep(u, v, border):
+	"""
+	Box Step
+
+	teleporter.randomStep: any cell of the board
+	"""
+	side = 2*border + 1
+	return (u*side).astype(numpy.int64) - border, (v*side).astype(numpy.int64) - border
+
+@jit
+def caughtBy(x, y, gx, gy):
+	"""
+	Caught By
+
+	checkCaught: row of the first guard standing on (x, y), -1 for none
+	"""
+	catcher = numpy.empty(len(x), dtype=numpy.int64)
+	catcher[:] = -1
+	for g in range(0, gx.shape[0]):
+		catcher[(gx[g] == x) & (gy[g] == y) & (catcher < 0)] = g
+	return catcher
+
+#### Helper Functions ####
+def supported(S):
+	"""
+	Supported
+
+	Raises an Exception for settings the step kernels don't play
+	"""
+	for name in ("BILLY_SUPER", "BILLY_OPTIMAL", "GUARD_LOS", "CENTER_ALARM", "QUARTILE_ALARMS"):
+		if S[name]:
+			raise Exception("The step kernels don't support", name)
+	simulation.smartSlopeCheck(S)
+
+def gameKey(S):
+	return packed.gameKey(S) + (S["WEAPON"], S["WEAPON_PROB"])
+
+def gameFor(scenario=None):
+	"""
+	Game For
+
+	Cached sweepGame of one scenario
+	"""
+	return sweepFor([scenario])
+
+def sweepFor(scenarios):
+	"""
+	Sweep For
+
+	Cached sweepGame for a list of scenarios
+	"""
+	settings = [simulation.settings(scenario) for scenario in scenarios]
+	for S in settings:
+		supported(S)
+	key = tuple(gameKey(S) for S in settings)
+	if key not in _games:
+		_games[key] = sweepGame(settings)
+	return _games[key]
+
+def runBatch(scenario=None, runs=10000):
+	"""
+	Run Batch
+
+	Plays runs escape attempts of one scenario at once, see sweepGame.run
+	"""
+	return gameFor(scenario).run(runs)
+
+def runSweep(scenarios, runs=10000):
+	"""
+	Run Sweep
+
+	Plays runs escape attempts of every scenario in one batch and returns
+	how many escaped in each
+	"""
+	outcomes = sweepFor(scenarios).run(runs)[0]
+	return outcomes.reshape(len(scenarios), runs).sum(axis=1)
+
+def ring(border):
+	"""
+	Ring
+
+	The square guard's perimeter in walking order, starting at a corner
+	"""
+	side = [(x, -border) for x in range(-border, border)]
+	side += [(border, y) for y in range(-border, border)]
+	side += [(x, border) for x in range(border, -border, -1)]
+	side += [(-border, y) for y in range(border, -border, -1)]
+	return side
+
+def flatten(lists):
+	"""
+	Flatten
+
+	Lists of one thing per scenario as (flat array, offsets, lengths)
+	"""
+	lengths = numpy.array([len(items) for items in lists], dtype=numpy.int64)
+	offsets = numpy.concatenate([[0], numpy.cumsum(lengths)[:-1]]).astype(numpy.int64)
+	flat = [item for items in lists for item in items]
+	return numpy.array(flat, dtype=numpy.int64).reshape(len(flat)), offsets, lengths
+
+def select(mask):
+	"""
+	Select
+
+	Index for the runs in mask: a plain slice when that is all of them
+	"""
+	if mask.all():
+		return slice(None)
+	return numpy.flatnonzero(mask)
+
+def benchmark(runs=10000, size=100000, report=print):
+	"""
+	Benchmark
+
+	Times every kernel on size draws (and its plain NumPy version, when
+	numba compiled it), the batch engine against the packed one, and one
+	sweep against its scenarios played one batch at a time
+	"""
+	report("Step kernels: %s" % (BACKEND if numba else "numpy (numba not installed, no JIT)"))
+	game = gameFor({"SMART_BILLY": True})
+	radius, offset, dx, dy, cumulative = game.smart
+	border = game.settings[0]["BORDER"]
+	u = numpy.random.random(size)
+	x = numpy.random.randint(-border, border+1, size).astype(numpy.int64)
+	y = numpy.random.randint(-border, border+1, size).astype(numpy.int64)
+	gx = numpy.random.randint(-border, border+1, (3, size)).astype(numpy.int64)
+	gy = numpy.random.randint(-border, border+1, (3, size)).astype(numpy.int64)
+	calls = {
+		"billyStep": (billyStep, (x, y, u)),
+		"smartStep": (smartStep, (x, y, u, radius[0], offset[0], dx, dy, cumulative)),
+		"sightStep": (sightStep, (x, y, u, gx, gy)),
+		"movementStep": (movementStep, (x, y, u, BISHOP[0], BISHOP[1], border)),
+		"knightStep": (knightStep, (x, y, u)),
+		"trailStep": (trailStep, (x, u, 8*border)),
+		"boxStep": (boxStep, (u, u, border)),
+		"caughtBy": (caughtBy, (x, y, gx, gy)),
+	}
+	for name, (kernel, args) in calls.items():
+		kernel(*args) # Compiles
+		line = "  %-13s %7.1f M/s" % (name, size/timed(kernel, args)/1e6)
+		if numba:
+			line += "   numpy %7.1f M/s" % (size/timed(kernel.py_func, args)/1e6)
+		report(line)
+	runBatch(None, 10) # Compiles the engine's kernels
+	for name, play in (("packed", lambda: sum(packed.runPacked() for i in range(0, runs))), ("batch", lambda: runBatch(None, runs)[0].sum())):
+		start = time.perf_counter()
+		escaped = play()
+		report("%-8s escaped %.4f  %.0f runs/s" % (name, escaped/runs, runs/(time.perf_counter() - start)))
+
+	scenarios = [{"BORDER": border, "KNIGHT": knight, "BILLY_LOS": los} for border in (3, 4, 5, 6) for knight in (False, True) for los in (False, True)]
+	each = max(1, runs//len(scenarios))
+	runSweep(scenarios, 10)
+	start = time.perf_counter()
+	one = [runBatch(scenario, each)[0].sum() for scenario in scenarios]
+	middle = time.perf_counter()
+	together = runSweep(scenarios, each)
+	end = time.perf_counter()
+	report("%d scenarios x %d runs: a batch each %.0f runs/s, one sweep %.0f runs/s (escaped %.4f vs %.4f)" % (len(scenarios), each,
+		each*len(scenarios)/(middle - start), each*len(scenarios)/(end - middle), sum(one)/each/len(scenarios), together.sum()/each/len(scenarios)))
+
+def timed(kernel, args, repeats=5):
+	"""
+	Timed
+
+	Best of repeats calls, in seconds
+	"""
+	best = float("inf")
+	for i in range(0, repeats):
+		start = time.perf_counter()
+		kernel(*args)
+		best = min(best, time.perf_counter() - start)
+	return best
+
+#### Class ####
+
+class sweepGame(object):
+	"""
+	Sweep Game
+
+	Tables for a list of scenarios, and run() to play many runs of each
+	in one batch.  Every run carries the index of its scenario, and the
+	settings that differ between scenarios (border, powers, WEAPON_PROB,
+	trails and smartStep tables) are looked up through it.  Guards are
+	slots shared by every scenario; a scenario without one parks it far
+	off the board where it never moves, sees or catches anyone.
+	"""
+	WALK, TRAIL, KNIGHT, TELEPORTER = range(0, 4)
+
+	def __init__(self, settings):
+		self.settings = settings
+		flag = lambda name: numpy.array([bool(S[name]) for S in settings])
+		self.border = numpy.array([S["BORDER"] for S in settings], dtype=numpy.int64)
+		self.smartOn, self.losOn = flag("SMART_BILLY"), flag("BILLY_LOS")
+		self.billySprint, self.guardSprint = flag("BILLY_SPRINT"), flag("GUARD_SPRINT")
+		self.weapon = flag("WEAPON")
+		self.weaponProb = numpy.array([S["WEAPON_PROB"] for S in settings])
+		self.board = [flatten([[loc[axis] for loc in self.cells(S["BORDER"])] for S in settings]) for axis in (0, 1)]
+
+		# Guard slots, in makeGuards order: (kind, name, parameters, which scenarios have it)
+		self.guards = []
+		if any(S["PERIMGUARD"] for S in settings):
+			trails = [ring(S["BORDER"]) if S["PERIMGUARD"] else [] for S in settings]
+			corners = [[i for i, loc in enumerate(trail) if abs(loc[0]) == abs(loc[1])] for trail in trails]
+			self.guards.append((self.TRAIL, "squareGuard", self.trails(trails, corners), flag("PERIMGUARD")))
+		if any(S["PATHGUARD"] for S in settings):
+			trails = [S["GUARD_PATH"] if S["PATHGUARD"] else [] for S in settings]
+			self.guards.append((self.TRAIL, "pathGuard", self.trails(trails, [[trail.index(loc) for loc in trail] for trail in trails]), flag("PATHGUARD")))
+		if any(S["BISHOP"] for S in settings):
+			self.guards.append((self.WALK, "bishop", BISHOP, flag("BISHOP")))
+		if any(S["ROOK"] for S in settings):
+			self.guards.append((self.WALK, "rook", ROOK, flag("ROOK")))
+		if any(S["KNIGHT"] for S in settings):
+			self.guards.append((self.KNIGHT, "knight", None, flag("KNIGHT")))
+		for i in range(0, max(S["TELEPORTERS"] if S["TELEPORTER"] else 0 for S in settings)):
+			self.guards.append((self.TELEPORTER, "teleporter", None, numpy.array([bool(S["TELEPORTER"]) and i < S["TELEPORTERS"] for S in settings])))
+		self.names = [name for kind, name, parameters, present in self.guards] + ["trapped"]
+
+		self.smart = None
+		if self.smartOn.any():
+			self.smart = self.smartTables()
+
+	def cells(self, border):
+		return [(x,y) for x in range(-border, border+1) for y in range(-border, border+1) if not((x,y) == (0,0))]
+
+	def trails(self, trails, starts):
+		"""
+		Trails
+
+		Flat trails and starting places of one trail guard slot, as
+		(x, y, offsets, lengths, starts, start offsets, start counts)
+		"""
+		x, offsets, lengths = flatten([[loc[0] for loc in trail] for trail in trails])
+		y = flatten([[loc[1] for loc in trail] for trail in trails])[0]
+		return (x, y, offsets, lengths) + flatten(starts)
+
+	def smartTables(self):
+		"""
+		Smart Tables
+
+		smartStep's (radius, offset, dx, dy, cumulative) for every scenario:
+		a table row for every cell within radius of the center, rows of
+		all the scenarios one after the other
+		"""
+		radius = numpy.zeros(len(self.settings), dtype=numpy.int64)
+		offset = numpy.zeros(len(self.settings), dtype=numpy.int64)
+		dx, dy, cumulative = [], [], []
+		for s, S in enumerate(self.settings):
+			if not(S["SMART_BILLY"]):
+				continue
+			moves = 2 if S["BILLY_LOS"] else 1 # Moves in one billyUpdate, smartUpdate first
+			radius[s] = S["BORDER"] + moves if S["BILLY_SPRINT"] else S["BORDER"] # A sprint's second smartUpdate starts where the first billyUpdate ended
+			offset[s] = len(cumulative)//MOVES
+			for y in range(-radius[s], radius[s]+1):
+				for x in range(-radius[s], radius[s]+1):
+					total = 0
+					moves = kernels.smartMoves(S["BORDER"], (int(x),int(y)), S["SMART_SLOPE"])
+					for j in range(0, MOVES):
+						if j < len(moves):
+							loc, prob = moves[j]
+							total += prob
+							dx.append(loc[0] - x)
+							dy.append(loc[1] - y)
+						else:
+							dx.append(0)
+							dy.append(0)
+						cumulative.append(total)
+		return radius, offset, numpy.array(dx, dtype=numpy.int64), numpy.array(dy, dtype=numpy.int64), numpy.array(cumulative)
+
+	def run(self, runs):
+		"""
+		Run
+
+		Plays runs escape attempts of every scenario, stepped exactly like
+		packedGame.run (and runSimulation's weaponCheck), and returns arrays
+		(outcomes, lengths, x, y, catchers): 1 for an escape, how many steps
+		it took, where Billy ended up, and the index into names of what
+		caught him (-1 if he escaped).  Run k of scenario s is at s*runs + k.
+		"""
+		random = numpy.random.random
+		trapped = len(self.names) - 1
+		total = runs*len(self.settings)
+
+		outcomes = numpy.zeros(total, dtype=numpy.int64)
+		lengths = numpy.zeros(total, dtype=numpy.int64)
+		endX = numpy.zeros(total, dtype=numpy.int64)
+		endY = numpy.zeros(total, dtype=numpy.int64)
+		catchers = numpy.zeros(total, dtype=numpy.int64)
+
+		# State of the runs still going, one column each
+		ids = numpy.arange(0, total)
+		sid = ids//runs # Scenario of each run
+		bx = numpy.zeros(total, dtype=numpy.int64)
+		by = numpy.zeros(total, dtype=numpy.int64)
+		gx = numpy.full((len(self.guards), total), packed.FAR, dtype=numpy.int64)
+		gy = numpy.full((len(self.guards), total), packed.FAR, dtype=numpy.int64)
+		index = numpy.zeros((len(self.guards), total), dtype=numpy.int64) # Trail guards' place on their trail
+		present = numpy.array([slot[3][sid] for slot in self.guards], dtype=numpy.bool_).reshape(len(self.guards), total)
+		(boardX, boardOffsets, boardCounts), boardY = self.board[0], self.board[1][0]
+		for i, (kind, name, parameters, there) in enumerate(self.guards):
+			p = numpy.flatnonzero(present[i])
+			s = sid[p]
+			if kind == self.TRAIL:
+				tx, ty, offsets, trailLengths, starts, startOffsets, startCounts = parameters
+				index[i, p] = starts[startOffsets[s] + (random(len(p))*startCounts[s]).astype(numpy.int64)]
+				gx[i, p], gy[i, p] = tx[offsets[s] + index[i, p]], ty[offsets[s] + index[i, p]]
+			else:
+				start = boardOffsets[s] + (random(len(p))*boardCounts[s]).astype(numpy.int64)
+				gx[i, p], gy[i, p] = boardX[start], boardY[start]
+		caught = numpy.zeros(total, dtype=numpy.bool_)
+		out = numpy.zeros(total, dtype=numpy.bool_)
+		catcher = numpy.full(total, -1, dtype=numpy.int64)
+		armed = self.weapon[sid]
+
+		def guardStep(mask, border):
+			for i, (kind, name, parameters, there) in enumerate(self.guards):
+				chosen = present[i] & mask
+				n = int(chosen.sum())
+				if n == 0:
+					continue
+				p = select(chosen)
+				if kind == self.WALK:
+					gx[i, p], gy[i, p] = movementStep(gx[i, p], gy[i, p], random(n), parameters[0], parameters[1], border[p])
+				elif kind == self.TRAIL:
+					tx, ty, offsets, trailLengths = parameters[:4]
+					s = sid[p]
+					index[i, p] = trailStep(index[i, p], random(n), trailLengths[s])
+					gx[i, p], gy[i, p] = tx[offsets[s] + index[i, p]], ty[offsets[s] + index[i, p]]
+				elif kind == self.KNIGHT:
+					gx[i, p], gy[i, p] = knightStep(gx[i, p], gy[i, p], random(n))
+				else:
+					gx[i, p], gy[i, p] = boxStep(random(n), random(n), border[p])
+
+		def check(mask):
+			hit = numpy.where(mask, caughtBy(bx, by, gx, gy), -1)
+			first = (catcher < 0) & (hit >= 0)
+			catcher[first] = hit[first]
+			return hit >= 0
+
+		def moved(p, border):
+			"""
+			Moved
+
+			Out of bounds and weaponCheck after Billy moved in runs p
+			"""
+			out[p] |= (numpy.abs(bx[p]) > border[p]) | (numpy.abs(by[p]) > border[p])
+			if armed.any():
+				where = numpy.arange(0, len(bx))[p]
+				hits = (gx[:, where] == bx[where]) & (gy[:, where] == by[where]) # weaponCheck draws once for every guard on Billy
+				wins = hits & (random(hits.shape) < self.weaponProb[sid[where]])
+				survived = where[armed[where] & wins.any(axis=0)]
+				bx[survived] = 0 # Reset location
+				by[survived] = 0
+				armed[survived] = False
+
+		def billyMove(mask, border):
+			smart, los = self.smartOn[sid] & mask, self.losOn[sid] & mask
+			if smart.any():
+				p = select(smart)
+				radius, offset, dx, dy, cumulative = self.smart
+				r = radius[sid[p]]
+				if (numpy.abs(bx[p]) > r).any() or (numpy.abs(by[p]) > r).any(): # Would read another cell's or scenario's rows
+					raise Exception("Billy is past the smartStep tables")
+				bx[p], by[p] = smartStep(bx[p], by[p], random(int(smart.sum())), radius[sid[p]], offset[sid[p]], dx, dy, cumulative)
+				moved(p, border)
+			if los.any():
+				p = select(los)
+				bx[p], by[p], stuck = sightStep(bx[p], by[p], random(int(los.sum())), gx[:, p], gy[:, p])
+				caught[p] |= stuck
+				moved(p, border)
+			plain = mask & ~(smart | los)
+			if plain.any():
+				p = select(plain)
+				bx[p], by[p] = billyStep(bx[p], by[p], random(int(plain.sum())))
+				moved(p, border)
+
+		tick = 0
+		while len(ids):
+			border = self.border[sid]
+			everyone = numpy.ones(len(ids), dtype=numpy.bool_)
+			guardStep(everyone, border)
+			sprint = self.guardSprint[sid]
+			if sprint.any():
+				caught |= check(sprint)
+				guardStep(sprint, border)
+
+			billyMove(everyone, border)
+			sprint = self.billySprint[sid]
+			if sprint.any():
+				caught |= check(sprint)
+				billyMove(sprint, border)
+
+			caught |= check(everyone)
+			tick += 1
+
+			done = caught | out
+			if done.any():
+				finished = ids[done]
+				outcomes[finished] = ~caught[done]
+				lengths[finished] = tick
+				endX[finished] = bx[done]
+				endY[finished] = by[done]
+				catchers[finished] = numpy.where(catcher[done] >= 0, catcher[done], numpy.where(caught[done], trapped, -1))
+				going = ~done
+				ids, sid, bx, by, caught, out, catcher, armed = ids[going], sid[going], bx[going], by[going], caught[going], out[going], catcher[going], armed[going]
+				gx, gy, index, present = gx[:, going], gy[:, going], index[:, going], present[:, going]
+		return outcomes, lengths, endX, endY, catchers
+
+def main():
+	from sys import argv
+	runs = 10000
+	if len(argv) > 1:
+		runs = int(argv[1])
+	benchmark(runs)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Surrogate
+
+Gaussian process surrogate for sweeps over scenarios.
+
+A sweep is every combination of a few SCENARIO axes (guard line up,
+BORDER, powers, alarms...) and most of its cells are boring.  Here the
+escape rates already simulated (kept in a sweepCache file) train a
+Gaussian process on scenario features, which predicts every other cell
+with an uncertainty.  explore() keeps simulating the cell the model is
+least sure about until every cell is known to within a target standard
+error, so a map comes out of a fraction of the runs a full sweep takes.
+
+The process models logit(escape rate), so predictions stay between 0
+and 1, with each simulated cell's binomial noise on that scale.  Its
+kernel is a squared exponential plus a linear trend, and its
+hyperparameters (length scale, signal size, trend size) are picked by
+marginal likelihood over a small grid.
+
+	python surrogate.py [runs per cell] [target error]
+"""
+
+import itertools
+import json
+import math
+import os
+import numpy
+import packed
+import policy
+import simulation
+
+CACHE = os.path.join(policy.CACHE_ROOT, "sweep_cache.jsonl")
+POWERS = ["BILLY_SPRINT", "SMART_BILLY", "BILLY_LOS", "BILLY_SUPER", "BILLY_OPTIMAL", "WEAPON", "GUARD_LOS", "CENTER_ALARM", "QUARTILE_ALARMS", "GUARD_SPRINT"]
+GUARDS = ["PERIMGUARD", "PATHGUARD", "BISHOP", "ROOK", "KNIGHT"]
+LENGTHS = (0.5, 0.75, 1, 1.5, 2, 3, 4, 6, 8, 12) # Length scales tried, in standard deviations of the features
+SIGNALS = (0.01, 0.03, 0.1, 0.25, 0.5, 1, 2, 4) # Signal variances tried, on the logit scale
+TRENDS = (0, 0.01, 0.1, 1) # Prior variances of the linear trend's slopes
+
+#### Helper Functions ####
+def features(scenario):
+	"""
+	Features
+
+	Numbers describing a scenario: which guards and powers are on, how
+	many teleporters, log BORDER and the weapon's odds
+	"""
+	S = simulation.settings(scenario)
+	row = [float(S[name]) for name in GUARDS + POWERS]
+	row.append(S["TELEPORTERS"] if S["TELEPORTER"] else 0)
+	row.append(math.log(S["BORDER"]))
+	row.append(S["WEAPON_PROB"] if S["WEAPON"] else 0)
+	return row
+
+def sweep(axes):
+	"""
+	Sweep
+
+	Every combination of axes (SCENARIO name -> list of values) as a list
+	of scenarios
+	"""
+	names = list(axes)
+	return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+
+def key(scenario):
+	"""
+	Key
+
+	Canonical JSON of the full settings, so a scenario has one key however
+	it was written ({} and {"BORDER": 4} are the same cell)
+	"""
+	return json.dumps(simulation.settings(scenario), sort_keys=True)
+
+def logit(escaped, runs):
+	"""
+	Logit
+
+	Escape rate of a cell on the logit scale and the variance of that,
+	with half a run added either way so 0 and 1 stay finite
+	"""
+	rate = (escaped + 0.5)/(runs + 1)
+	return math.log(rate/(1 - rate)), 1/((runs + 1)*rate*(1 - rate))
+
+def simulate(scenario, runs):
+	"""
+	Simulate
+
+	How many of `runs` runs Billy escaped, on the packed engine when it
+	supports the scenario
+	"""
+	play = simulation.runSimulation
+	try:
+		packed.supported(simulation.settings(scenario))
+		play = packed.runPacked
+	except Exception:
+		pass
+	return sum(play(scenario) for i in range(0, runs))
+
+def explore(space, cache, runs=400, target=0.03, budget=None, evaluate=simulate, start=8, report=print):
+	"""
+	Explore
+
+	Simulates cells of space (a list of scenarios), `runs` runs at a time,
+	always the one the surrogate is least sure about, until every cell's
+	predicted standard error is below target or `budget` runs are spent.
+	evaluate(scenario, runs) returns how many escaped.  Returns the fitted
+	surrogate and the runs spent.
+	"""
+	spent = 0
+	known = [s for s in space if cache.has(s)]
+	unknown = [s for s in space if not(cache.has(s))]
+	for i in numpy.random.permutation(len(unknown))[:max(0, start - len(known))]:
+		cache.add(unknown[i], evaluate(unknown[i], runs), runs)
+		spent += runs
+
+	while True:
+		model = surrogate(cache.results())
+		mean, error = model.predict(space)
+		worst = int(numpy.argmax(error))
+		if error[worst] < target or (budget is not None and spent + runs > budget):
+			break
+		if report:
+			report("%4d runs  worst error %.3f  simulating %s" % (spent, error[worst], space[worst]))
+		cache.add(space[worst], evaluate(space[worst], runs), runs)
+		spent += runs
+	return model, spent
+
+#### Class ####
+
+class sweepCache(object):
+	"""
+	Sweep Cache
+
+	Simulated escape counts of scenarios, appended to a JSON lines file.
+	Runs of the same scenario add up.
+	"""
+	def __init__(self, path=CACHE):
+		self.path = path
+		self.counts = {} # key -> [scenario, escaped, runs]
+		if path and os.path.exists(path):
+			with open(path) as f:
+				for line in f:
+					record = json.loads(line)
+					self.count(record["scenario"], record["escaped"], record["runs"])
+
+	def count(self, scenario, escaped, runs):
+		k = key(scenario)
+		if k not in self.counts:
+			self.counts[k] = [scenario, 0, 0]
+		self.counts[k][1] += escaped
+		self.counts[k][2] += runs
+
+	def add(self, scenario, escaped, runs):
+		self.count(scenario, escaped, runs)
+		if self.path:
+			os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+			with open(self.path, "a") as f:
+				f.write(json.dumps({"scenario": scenario, "escaped": escaped, "runs": runs}) + "\n")
+
+	def has(self, scenario):
+		return key(scenario) in self.counts
+
+	def results(self):
+		return [tuple(entry) for entry in self.counts.values()]
+
+class surrogate(object):
+	"""
+	Surrogate
+
+	Gaussian process on logit escape rates, fitted to (scenario, escaped,
+	runs) results
+	"""
+	def __init__(self, results):
+		if not results:
+			raise Exception("The surrogate needs at least one simulated scenario")
+		X = numpy.array([features(s) for s, escaped, runs in results])
+		self.shift = X.mean(axis=0)
+		self.scale = X.std(axis=0)
+		self.scale[self.scale == 0] = 1 # Features every result shares
+		self.X = (X - self.shift)/self.scale
+		y, noise = zip(*(logit(escaped, runs) for s, escaped, runs in results))
+		self.noise = numpy.array(noise)
+		self.y = numpy.array(y)
+		self.mean = (self.y/self.noise).sum()/(1/self.noise).sum()
+
+		fits = (self.fit((length, signal, trend)) for length in LENGTHS for signal in SIGNALS for trend in TRENDS)
+		self.likelihood, self.hyper, self.factor, self.alpha = max(fits, key=lambda fit: fit[0])
+
+	def kernel(self, A, B, hyper):
+		"""
+		Kernel
+
+		Squared exponential plus a linear trend: escape odds move roughly
+		additively with each guard and power on the logit scale, and the
+		squared exponential picks up what doesn't
+		"""
+		length, signal, trend = hyper
+		distance = ((A[:, None, :] - B[None, :, :])**2).sum(axis=2)
+		return signal*numpy.exp(-distance/(2*length**2)) + trend*(A @ B.T)
+
+	def fit(self, hyper):
+		"""
+		Fit
+
+		(log marginal likelihood, hyperparameters, Cholesky factor, weights)
+		for one choice of (length, signal, trend)
+		"""
+		K = self.kernel(self.X, self.X, hyper) + numpy.diag(self.noise)
+		factor = numpy.linalg.cholesky(K)
+		alpha = numpy.linalg.solve(factor.T, numpy.linalg.solve(factor, self.y - self.mean))
+		likelihood = -0.5*(self.y - self.mean) @ alpha - numpy.log(numpy.diag(factor)).sum()
+		return likelihood, hyper, factor, alpha
+
+	def predict(self, scenarios):
+		"""
+		Predict
+
+		Escape rate of each scenario and its standard error, as arrays.
+		The logit scale mean and variance are carried back through the
+		logistic curve.
+		"""
+		X = (numpy.array([features(s) for s in scenarios]) - self.shift)/self.scale
+		Ks = self.kernel(X, self.X, self.hyper)
+		mu = self.mean + Ks @ self.alpha
+		v = numpy.linalg.solve(self.factor, Ks.T)
+		prior = self.hyper[1] + self.hyper[2]*(X**2).sum(axis=1)
+		variance = numpy.maximum(prior - (v**2).sum(axis=0), 0)
+		rate = 1/(1 + numpy.exp(-mu))
+		return rate, rate*(1 - rate)*numpy.sqrt(variance)
+
+def main():
+	from sys import argv
+	runs = 400
+	target = 0.03
+	if len(argv) > 1:
+		runs = int(argv[1])
+	if len(argv) > 2:
+		target = float(argv[2])
+
+	space = sweep({"BORDER": [3, 4, 5, 6, 7, 8], "KNIGHT": [False, True], "BISHOP": [False, True], "ROOK": [False, True], "BILLY_LOS": [False, True]})
+	cache = sweepCache()
+	model, spent = explore(space, cache, runs, target)
+	rate, error = model.predict(space)
+	simulated = sum(1 for s in space if cache.has(s))
+	print("\nSimulated %d of %d cells (%d runs this time); a full sweep takes %d runs" % (simulated, len(space), spent, runs*len(space)))
+	for scenario, r, e in zip(space, rate, error):
+		print("%.3f +/- %.3f  %s%s" % (r, e, scenario, "  *" if cache.has(scenario) else ""))
+
+if __name__ == "__main__":
+	main()